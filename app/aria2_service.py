@@ -11,6 +11,8 @@ import threading
 from typing import List, Dict, Optional
 from pathlib import Path
 
+from .http_clients import http_clients
+
 logger = logging.getLogger(__name__)
 
 class Aria2Service:
@@ -126,7 +128,8 @@ class Aria2Service:
                 "Accept": "application/json"
             }
             
-            response = requests.post(
+            response = http_clients.request(
+                "POST",
                 self.rpc_url,
                 json=payload,
                 headers=headers,
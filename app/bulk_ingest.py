@@ -0,0 +1,96 @@
+"""
+Bulk ingest of imported URLs.
+Source URLs are normalized (tracking parameters, fragments and default ports
+removed) into the dedupe key and checked against the `videos.source_url` index one
+chunk at a time; the new rows are inserted with a single executemany per chunk,
+inside the caller's transaction, with their fetch URL untouched. A URL that is
+already in the library is skipped, not reprocessed.
+"""
+import urllib.parse
+from typing import Dict, Iterable, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .database import Video
+
+# Query parameters that only identify the referrer / campaign, never the video
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "referrer", "si", "feature", "_ga", "spm",
+}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Two bound parameters per URL (raw + normalized) stays under SQLite's 999 variable limit
+CHUNK_SIZE = 400
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for de-duplication; local paths are only stripped"""
+    url = (url or "").strip()
+    if not url.lower().startswith(("http://", "https://")):
+        return url
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username:
+        host = f"{parts.username}{':' + parts.password if parts.password else ''}@{host}"
+    # Remaining parameters are kept byte-for-byte - signed stream URLs must not be re-encoded
+    query = []
+    for pair in parts.query.split("&"):
+        key = urllib.parse.unquote_plus(pair.split("=", 1)[0]).lower()
+        if pair and key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES):
+            query.append(pair)
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", "&".join(query), ""))
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def bulk_ingest(db: Session, rows: Iterable[Dict], batch_name: str, status: str = "pending") -> Dict:
+    """
+    rows: dicts with `url` and optionally `source_url`, `title`, `thumbnail_path`.
+    Inserts the rows whose (normalized) source_url is not in the library yet - the caller
+    commits. Returns {"inserted", "skipped", "invalid", "ids"}; ids keep the input order.
+    """
+    pending: Dict[str, Dict] = {}
+    raw_forms: Dict[str, set] = {}
+    invalid = skipped = 0
+    for row in rows:
+        url = (row.get("url") or "").strip()
+        if not url:
+            invalid += 1
+            continue
+        raw_source = (row.get("source_url") or url).strip()
+        source = normalize_url(raw_source)
+        if source in pending:
+            skipped += 1
+            continue
+        # Only the dedupe key is normalized - the fetch URL is stored exactly as given
+        # (signed stream URLs and sites that need their query parameters)
+        pending[source] = {
+            "title": (row.get("title") or "Queued...")[:500],
+            "url": url,
+            "source_url": source,
+            "thumbnail_path": row.get("thumbnail_path"),
+            "batch_name": batch_name,
+            "status": status,
+        }
+        raw_forms[source] = {source, raw_source}
+
+    ids: List[int] = []
+    for chunk in _chunks(list(pending), CHUNK_SIZE):
+        # Rows imported before normalization may still hold the raw URL
+        lookup = set().union(*(raw_forms[s] for s in chunk))
+        existing = {r[0] for r in db.query(Video.source_url).filter(Video.source_url.in_(lookup))}
+        new_rows = [pending[s] for s in chunk if not raw_forms[s] & existing]
+        skipped += len(chunk) - len(new_rows)
+        if new_rows:
+            result = db.execute(insert(Video).returning(Video.id, sort_by_parameter_order=True), new_rows)
+            ids.extend(r[0] for r in result)
+    return {"inserted": len(ids), "skipped": skipped, "invalid": invalid, "ids": ids}
@@ -1,14 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, DateTime, Text, JSON, text
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, Float, DateTime, Text, JSON, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 from sqlalchemy import event
+import os
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./videos.db"
+# Seconds a write waits for the lock held by another pool thread before "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("VIP_DB_BUSY_TIMEOUT", 30))
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
     pool_size=20,
     max_overflow=40,
     pool_timeout=60
@@ -23,12 +26,37 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Indexes for the grid filters/sorts (get_videos, export, smart playlist rules).
+# SQLite appends the rowid to every index, so each one also serves "ORDER BY <col>, id"
+# and "<col> = ? ORDER BY id DESC" without a sort. Checked by app/test_query_plans.py.
+VIDEO_INDEXES = {
+    "ix_videos_duration": ("duration",),              # longest / shortest, duration range
+    "ix_videos_height": ("height",),                  # quality tiers
+    "ix_videos_created_at": ("created_at",),          # date range
+    "ix_videos_is_favorite": ("is_favorite",),        # favorites only
+    "ix_videos_status": ("status",),                  # smart playlist status rules
+    "ix_videos_batch_duration": ("batch_name", "duration"),  # batch view sorted by length
+    "ix_videos_batch_title": ("batch_name", "title"),        # batch view A-Z
+    "ix_videos_updated_at": ("updated_at",),          # delta export (?since=)
+}
+
+# Columns a delta export (/api/export?since=) carries; changing one of them bumps
+# updated_at. Playback/progress columns (resume_time, previews, ...) don't.
+VIDEO_SYNC_COLUMNS = ("title", "url", "source_url", "batch_name", "duration", "width", "height",
+                      "tags", "ai_tags", "is_favorite", "is_watched", "status")
+UPDATED_AT_DDL = (
+    f"CREATE TRIGGER IF NOT EXISTS videos_updated_at AFTER UPDATE OF {', '.join(VIDEO_SYNC_COLUMNS)} ON videos "
+    "WHEN new.updated_at IS old.updated_at BEGIN "
+    # Same text format as SQLAlchemy's DateTime (microseconds), so ?since= compares correctly
+    "UPDATE videos SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') || '000' WHERE id = new.id; END"
+)
+
 class Video(Base):
     __tablename__ = "videos"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     url = Column(String)
-    source_url = Column(String) # For JIT link refreshing
+    source_url = Column(String, index=True) # For JIT link refreshing + import dedupe
     thumbnail_path = Column(String)
     gif_preview_path = Column(String)
     preview_path = Column(String)
@@ -46,6 +74,8 @@ class Video(Base):
     status = Column(String, default="pending")
     error_msg = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow) # udržiava trigger videos_updated_at
+    __table_args__ = tuple(Index(name, *cols) for name, cols in VIDEO_INDEXES.items())
 
 class SmartPlaylist(Base):
     __tablename__ = "smart_playlists"
@@ -54,9 +84,192 @@ class SmartPlaylist(Base):
     rules = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, index=True)
+    payload = Column(JSON)
+    result = Column(JSON, nullable=True)
+    status = Column(String, default="queued", index=True) # queued, running, done, failed
+    priority = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow)
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index('ix_jobs_dispatch', 'status', 'priority', 'run_after'),)
+
+class SubtitleCue(Base):
+    __tablename__ = "subtitle_cues"
+    id = Column(Integer, primary_key=True)
+    video_id = Column(Integer, index=True)
+    start = Column(Float)
+    end = Column(Float)
+    text = Column(Text)
+
+# Full-text index over subtitle_cues.text (external content - the text is stored once)
+SUBTITLE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS subtitle_cues_fts USING fts5(text, content='subtitle_cues', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS subtitle_cues_ai AFTER INSERT ON subtitle_cues BEGIN "
+    "INSERT INTO subtitle_cues_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS subtitle_cues_ad AFTER DELETE ON subtitle_cues BEGIN "
+    "INSERT INTO subtitle_cues_fts(subtitle_cues_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS subtitle_cues_au AFTER UPDATE ON subtitle_cues BEGIN "
+    "INSERT INTO subtitle_cues_fts(subtitle_cues_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO subtitle_cues_fts(rowid, text) VALUES (new.id, new.text); END",
+    # Deleting videos (also bulk query deletes) drops their cues
+    "CREATE TRIGGER IF NOT EXISTS videos_ad_subtitle_cues AFTER DELETE ON videos BEGIN "
+    "DELETE FROM subtitle_cues WHERE video_id = old.id; END",
+]
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, index=True) # lowercase, bez medzier na okrajoch
+    video_count = Column(Integer, default=0, index=True) # udržiava trigger na video_tags
+
+class VideoTag(Base):
+    # Tags and AI tags of a video, one row per distinct tag
+    __tablename__ = "video_tags"
+    tag_id = Column(Integer, primary_key=True)
+    video_id = Column(Integer, primary_key=True, index=True)
+
+TAG_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS video_tags_ai AFTER INSERT ON video_tags BEGIN "
+    "UPDATE tags SET video_count = video_count + 1 WHERE id = new.tag_id; END",
+    "CREATE TRIGGER IF NOT EXISTS video_tags_ad AFTER DELETE ON video_tags BEGIN "
+    "UPDATE tags SET video_count = video_count - 1 WHERE id = old.tag_id; END",
+    "CREATE TRIGGER IF NOT EXISTS videos_ad_video_tags AFTER DELETE ON videos BEGIN "
+    "DELETE FROM video_tags WHERE video_id = old.id; END",
+]
+
+# Title/tag/batch search index for /api/videos and /api/export. Only changes of the
+# indexed columns touch it - status/progress updates of a video don't.
+VIDEO_FTS_COLUMNS = "title, tags, ai_tags, batch_name"
+VIDEO_FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5({VIDEO_FTS_COLUMNS}, content='videos', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='3')",
+    "CREATE TRIGGER IF NOT EXISTS videos_fts_ai AFTER INSERT ON videos BEGIN "
+    f"INSERT INTO videos_fts(rowid, {VIDEO_FTS_COLUMNS}) VALUES (new.id, new.title, new.tags, new.ai_tags, new.batch_name); END",
+    "CREATE TRIGGER IF NOT EXISTS videos_fts_ad AFTER DELETE ON videos BEGIN "
+    f"INSERT INTO videos_fts(videos_fts, rowid, {VIDEO_FTS_COLUMNS}) VALUES ('delete', old.id, old.title, old.tags, old.ai_tags, old.batch_name); END",
+    f"CREATE TRIGGER IF NOT EXISTS videos_fts_au AFTER UPDATE OF {VIDEO_FTS_COLUMNS} ON videos BEGIN "
+    f"INSERT INTO videos_fts(videos_fts, rowid, {VIDEO_FTS_COLUMNS}) VALUES ('delete', old.id, old.title, old.tags, old.ai_tags, old.batch_name); "
+    f"INSERT INTO videos_fts(rowid, {VIDEO_FTS_COLUMNS}) VALUES (new.id, new.title, new.tags, new.ai_tags, new.batch_name); END",
+]
+
+class StatsCounter(Base):
+    # Library statistics kept current by triggers on videos (tag counts live in tags.video_count)
+    __tablename__ = "stats_counters"
+    dimension = Column(String, primary_key=True) # total, batch, quality, status, duration
+    key = Column(String, primary_key=True)
+    value = Column(Integer, default=0)
+
+# dimension -> SQL expression of a videos row ({row} = new / old / videos)
+STATS_DIMENSIONS = {
+    "total": "'all'",
+    "batch": "COALESCE({row}.batch_name, '')",
+    "quality": "CASE WHEN {row}.height >= 2160 THEN '4K' WHEN {row}.height >= 1080 THEN 'FHD' "
+               "WHEN {row}.height >= 720 THEN 'HD' WHEN {row}.height > 0 THEN 'SD' ELSE 'Unknown' END",
+    "status": "COALESCE({row}.status, 'pending')",
+    "duration": "CASE WHEN COALESCE({row}.duration, 0) <= 0 THEN 'Unknown' WHEN {row}.duration < 60 THEN '<1 min' "
+                "WHEN {row}.duration < 300 THEN '1-5 min' WHEN {row}.duration < 1200 THEN '5-20 min' "
+                "WHEN {row}.duration < 3600 THEN '20-60 min' ELSE '60+ min' END",
+}
+# Column whose update can move a video to another key of the dimension
+STATS_COLUMNS = {"batch": "batch_name", "quality": "height", "status": "status", "duration": "duration"}
+
+def _stats_add(dimension: str, row: str, delta: int) -> str:
+    key = STATS_DIMENSIONS[dimension].format(row=row)
+    return (f"INSERT INTO stats_counters (dimension, key, value) VALUES ('{dimension}', {key}, {delta}) "
+            f"ON CONFLICT (dimension, key) DO UPDATE SET value = value + {delta};")
+
+STATS_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS videos_stats_ai AFTER INSERT ON videos BEGIN "
+    + " ".join(_stats_add(d, "new", 1) for d in STATS_DIMENSIONS) + " END",
+    "CREATE TRIGGER IF NOT EXISTS videos_stats_ad AFTER DELETE ON videos BEGIN "
+    + " ".join(_stats_add(d, "old", -1) for d in STATS_DIMENSIONS) + " END",
+] + [
+    # Status/progress updates only touch the counters when the bucket really changes
+    f"CREATE TRIGGER IF NOT EXISTS videos_stats_au_{d} AFTER UPDATE OF {column} ON videos "
+    f"WHEN ({STATS_DIMENSIONS[d].format(row='old')}) IS NOT ({STATS_DIMENSIONS[d].format(row='new')}) BEGIN "
+    f"{_stats_add(d, 'old', -1)} {_stats_add(d, 'new', 1)} END"
+    for d, column in STATS_COLUMNS.items()
+]
+
+# Video columns smart playlist rules can test, by kind of value (rules are checked in app/queries.py)
+PLAYLIST_RULE_FIELDS = {
+    "title": "text", "batch_name": "text", "status": "text",
+    "tags": "tag", "ai_tags": "tag",
+    "duration": "number", "width": "number", "height": "number",
+    "is_favorite": "bool", "is_watched": "bool",
+}
+
+class DataVersion(Base):
+    # Change counters kept by triggers; caches compare the number instead of re-reading the data
+    __tablename__ = "data_versions"
+    name = Column(String, primary_key=True) # videos
+    value = Column(Integer, default=0)
+
+_BUMP_VIDEOS_VERSION = ("INSERT INTO data_versions (name, value) VALUES ('videos', 1) "
+                        "ON CONFLICT (name) DO UPDATE SET value = value + 1;")
+# Bumped when a video could enter or leave a smart playlist; progress/status churn
+# that leaves the rule columns as they were doesn't invalidate the cached playlists
+VERSION_DDL = [
+    f"CREATE TRIGGER IF NOT EXISTS videos_version_ai AFTER INSERT ON videos BEGIN {_BUMP_VIDEOS_VERSION} END",
+    f"CREATE TRIGGER IF NOT EXISTS videos_version_ad AFTER DELETE ON videos BEGIN {_BUMP_VIDEOS_VERSION} END",
+    f"CREATE TRIGGER IF NOT EXISTS videos_version_au AFTER UPDATE OF {', '.join(PLAYLIST_RULE_FIELDS)} ON videos "
+    f"WHEN {' OR '.join(f'new.{c} IS NOT old.{c}' for c in PLAYLIST_RULE_FIELDS)} BEGIN {_BUMP_VIDEOS_VERSION} END",
+]
+
+class DeletedVideo(Base):
+    # Tombstones for delta exports (/api/export?since=): updated_at can't report a deleted row
+    __tablename__ = "deleted_videos"
+    video_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, index=True)
+
+DELETED_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS videos_deleted_ad AFTER DELETE ON videos BEGIN "
+    "INSERT OR REPLACE INTO deleted_videos (video_id, deleted_at) "
+    "VALUES (old.id, strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'); END",
+    # SQLite can hand a deleted id to the next insert - that video is not deleted any more
+    "CREATE TRIGGER IF NOT EXISTS videos_deleted_ai AFTER INSERT ON videos BEGIN "
+    "DELETE FROM deleted_videos WHERE video_id = new.id; END",
+]
+
+class PlaylistSync(Base):
+    __tablename__ = "playlist_syncs"
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, unique=True, index=True)
+    title = Column(String, nullable=True)
+    batch_name = Column(String, nullable=True)
+    parser = Column(String, default="yt-dlp")
+    entries = Column(JSON) # URL položiek v poradí playlistu
+    entry_count = Column(Integer, default=0)
+    last_added = Column(Integer, default=0)
+    last_synced_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def create_video_indexes():
+    """Add missing VIDEO_INDEXES to an existing database (one short write lock per index)"""
+    from sqlalchemy import inspect
+    present = {i['name'] for i in inspect(engine).get_indexes('videos')}
+    missing = [name for name in VIDEO_INDEXES if name not in present]
+    for name in missing:
+        with engine.begin() as connection:
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON videos ({', '.join(VIDEO_INDEXES[name])})"))
+    if missing:
+        # Fresh statistics so the planner can pick between the new indexes
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE videos"))
+
 def init_db():
     from sqlalchemy import inspect
     inspector = inspect(engine)
+    # Tables present before this start-up (create_all below may add any missing model table)
+    existing = set(inspector.get_table_names())
     if not inspector.has_table("videos"):
         Base.metadata.create_all(bind=engine)
     else:
@@ -67,10 +280,83 @@ def init_db():
         if 'source_url' not in columns:
             with engine.connect() as connection:
                 connection.execute(text('ALTER TABLE videos ADD COLUMN source_url VARCHAR'))
+        if 'updated_at' not in columns:
+            with engine.begin() as connection:
+                connection.execute(text('ALTER TABLE videos ADD COLUMN updated_at DATETIME'))
+                connection.execute(text('UPDATE videos SET updated_at = created_at'))
+        # Import dedupe looks every URL up by source_url
+        with engine.begin() as connection:
+            connection.execute(text('CREATE INDEX IF NOT EXISTS ix_videos_source_url ON videos (source_url)'))
+        create_video_indexes()
+
+    with engine.begin() as connection:
+        connection.execute(text(UPDATED_AT_DDL))
 
     if not inspector.has_table("smart_playlists"):
          Base.metadata.create_all(bind=engine)
 
+    if not inspector.has_table("jobs"):
+        Base.metadata.create_all(bind=engine)
+
+    if not inspector.has_table("playlist_syncs"):
+        Base.metadata.create_all(bind=engine)
+
+    if not inspector.has_table("subtitle_cues_fts"):
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            for ddl in SUBTITLE_FTS_DDL:
+                connection.execute(text(ddl))
+            # Subtitles stored before the cue index have no timestamps - index them as one cue at 0s
+            connection.execute(text(
+                "INSERT INTO subtitle_cues (video_id, start, \"end\", text) "
+                "SELECT id, 0, 0, subtitle FROM videos WHERE subtitle IS NOT NULL AND subtitle != ''"
+            ))
+
+    if not inspector.has_table("videos_fts"):
+        with engine.begin() as connection:
+            for ddl in VIDEO_FTS_DDL:
+                connection.execute(text(ddl))
+            # Index the existing library once; the triggers keep it current from here on
+            connection.execute(text("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')"))
+
+    backfill = "video_tags" not in existing
+    if backfill:
+        Base.metadata.create_all(bind=engine)
+    # Triggers also for a fresh database, where create_all above made the tables already
+    with engine.begin() as connection:
+        for ddl in TAG_DDL:
+            connection.execute(text(ddl))
+    if backfill:
+        from .tags import backfill_tags
+        backfill_tags()
+
+    if "stats_counters" not in existing:
+        Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for ddl in STATS_DDL:
+            connection.execute(text(ddl))
+        if "stats_counters" not in existing:
+            # Count the existing library once, in the same transaction as the triggers
+            connection.execute(text("DELETE FROM stats_counters"))
+            for dimension, key in STATS_DIMENSIONS.items():
+                key = key.format(row="videos")
+                connection.execute(text(
+                    f"INSERT INTO stats_counters (dimension, key, value) "
+                    f"SELECT '{dimension}', {key}, count(*) FROM videos GROUP BY {key}"
+                ))
+
+    if "data_versions" not in existing:
+        Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for ddl in VERSION_DDL:
+            connection.execute(text(ddl))
+
+    if "deleted_videos" not in existing:
+        Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for ddl in DELETED_DDL:
+            connection.execute(text(ddl))
+
 def get_db():
     db = SessionLocal()
     try: yield db
@@ -0,0 +1,98 @@
+"""
+Streaming library export (/api/export).
+Rows are read in batches of EXPORT_BATCH from a column-only query (no ORM
+objects, no subtitles) and written out as NDJSON, CSV or a JSON array in
+~64 KB chunks, so memory stays flat however large the library is.
+A delta export adds a `deleted` field and ends with one tombstone row per video
+deleted since (id and deletion time in updated_at, other fields empty).
+"""
+import csv
+import datetime
+import io
+import json
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+from .database import VIDEO_SYNC_COLUMNS, DeletedVideo, Video
+
+EXPORT_FIELDS = ("id",) + VIDEO_SYNC_COLUMNS + ("created_at", "updated_at")
+DELTA_FIELDS = EXPORT_FIELDS + ("deleted",)
+EXPORT_BATCH = 1000
+CHUNK_BYTES = 64 * 1024
+
+FORMATS: Dict[str, Dict[str, str]] = {
+    "json": {"media_type": "application/json", "ext": "json"},
+    "ndjson": {"media_type": "application/x-ndjson", "ext": "ndjson"},
+    "csv": {"media_type": "text/csv; charset=utf-8", "ext": "csv"},
+}
+
+def export_columns():
+    return [getattr(Video, f) for f in EXPORT_FIELDS]
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+def _rows(query: Query, deleted: Optional[Query] = None) -> Iterator[Dict]:
+    # yield_per streams the result set instead of loading it with .all()
+    for row in query.yield_per(EXPORT_BATCH):
+        item = {f: _value(v) for f, v in zip(EXPORT_FIELDS, row)}
+        if deleted is not None:
+            item["deleted"] = False
+        yield item
+    if deleted is not None:
+        # Tombstones are not filtered: the deleted row's batch, tags, ... are gone
+        for video_id, deleted_at in deleted.yield_per(EXPORT_BATCH):
+            yield {**dict.fromkeys(EXPORT_FIELDS), "id": video_id, "updated_at": _value(deleted_at), "deleted": True}
+
+def _chunks(parts: Iterator[str]) -> Iterator[bytes]:
+    buf, size = [], 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= CHUNK_BYTES:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+def _ndjson(rows: Iterator[Dict], fields: Tuple[str, ...]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+def _json_array(rows: Iterator[Dict], fields: Tuple[str, ...]) -> Iterator[str]:
+    yield "["
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row, ensure_ascii=False)
+    yield "]"
+
+def _csv(rows: Iterator[Dict], fields: Tuple[str, ...]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if out.tell() >= CHUNK_BYTES:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+def deleted_since(db: Session, since: datetime.datetime) -> Query:
+    return (db.query(DeletedVideo.video_id, DeletedVideo.deleted_at)
+            .filter(DeletedVideo.deleted_at >= since).order_by(DeletedVideo.video_id))
+
+def stream_export(query: Query, fmt: str, close=None, deleted: Optional[Query] = None) -> Iterator[bytes]:
+    """
+    Encoded chunks of `query` (columns in EXPORT_FIELDS order); `close` runs when the stream ends.
+    deleted: (video_id, deleted_at) query of the tombstones a delta export appends.
+    """
+    writer = {"json": _json_array, "ndjson": _ndjson, "csv": _csv}[fmt]
+    fields = EXPORT_FIELDS if deleted is None else DELTA_FIELDS
+    try:
+        yield from _chunks(writer(_rows(query, deleted), fields))
+    finally:
+        if close:
+            close()
@@ -0,0 +1,116 @@
+"""
+Streaming parsers for uploaded import lists (TXT / CSV / JSON).
+The upload is spooled to app/cache/imports and parsed from disk row by row -
+TXT and CSV line by line, JSON with an incremental array parser - so memory
+stays bounded by the chunk size, not by the file size.
+"""
+import codecs
+import csv
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List
+
+UPLOAD_DIR = "app/cache/imports"
+READ_SIZE = 1024 * 1024
+# A single JSON array item larger than this is treated as a broken file
+MAX_JSON_ITEM = 16 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_SPACE = re.compile(r'\s*')
+_SEPARATORS = re.compile(r'[\s,]*')
+
+def _decode(raw: bytes) -> str:
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1', errors='ignore')
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class UploadReader:
+    """Iterates the rows of a spooled upload; `bytes_read` / `total_bytes` give progress"""
+
+    def __init__(self, path: str, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+
+    def rows(self) -> Iterator[Dict]:
+        with open(self.path, 'rb') as f:
+            if self.fmt == "csv":
+                yield from self._csv(f)
+            elif self.fmt == "json":
+                yield from self._json(f)
+            else:
+                yield from self._txt(f)
+
+    def _lines(self, f) -> Iterator[str]:
+        for raw in f:
+            self.bytes_read += len(raw)
+            yield _decode(raw)
+
+    def _txt(self, f) -> Iterator[Dict]:
+        for line in self._lines(f):
+            url = line.strip()
+            if url:
+                yield {"url": url}
+
+    def _csv(self, f) -> Iterator[Dict]:
+        # Očakávame stĺpce: title, url, prípadne ďalšie (prispôsobiť podľa .csv)
+        for row in csv.DictReader(self._lines(f)):
+            title = row.get('title') or row.get('name') or row.get('Title') or row.get('Name') or 'Untitled'
+            url = row.get('url') or row.get('Url') or row.get('URL')
+            if url:
+                yield {"url": url.strip(), "title": title}
+
+    def _json(self, f) -> Iterator[Dict]:
+        for item in self._json_items(f):
+            # Exports are either [{"video_url": ...}, ...] or a plain list of URLs
+            url = item.get('video_url') if isinstance(item, dict) else item
+            if url and str(url).startswith('http'):
+                yield {"url": str(url)}
+
+    def _json_items(self, f) -> Iterator:
+        """Yield the items of a top-level JSON array without loading the whole array"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buf, pos, eof, started = "", 0, False, False
+        while True:
+            pos = (_SEPARATORS if started else _SPACE).match(buf, pos).end()
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != '[':
+                        raise ValueError("JSON import expects a top-level array")
+                    started, pos = True, pos + 1
+                    continue
+                if buf[pos] == ']':
+                    return
+                try:
+                    item, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    item, end = None, None
+                # An item that reaches the end of the buffer may continue in the next read
+                if end is not None and (end < len(buf) or eof):
+                    pos = end
+                    yield item
+                    continue
+                if eof:
+                    raise ValueError("Invalid JSON in import file")
+            elif eof:
+                # A missing closing bracket (truncated export) still imports what was read
+                return
+            if len(buf) - pos > MAX_JSON_ITEM:
+                raise ValueError("JSON array item too large")
+            raw = f.read(READ_SIZE)
+            self.bytes_read += len(raw)
+            eof = not raw
+            buf, pos = buf[pos:] + decoder.decode(raw, final=eof), 0
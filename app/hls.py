@@ -0,0 +1,136 @@
+"""
+HLS helpers for visuals generation.
+Instead of letting ffmpeg network-seek inside a remote m3u8, pick the cheapest
+variant, download only the media segments covering the wanted time window and
+hand ffmpeg one local file.
+"""
+import logging
+import os
+import re
+import urllib.parse
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import requests
+
+from .http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# Lowest-bitrate variant that still gives a usable 640px thumbnail
+MIN_HEIGHT = int(os.environ.get("VIP_HLS_MIN_HEIGHT", 360))
+MAX_SEGMENTS = 8
+MAX_BYTES = 64 * 1024 * 1024
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+@dataclass
+class Segment:
+    uri: str
+    start: float
+    duration: float
+
+@dataclass
+class MediaPlaylist:
+    segments: List[Segment] = field(default_factory=list)
+    init_uri: Optional[str] = None
+    encrypted: bool = False
+    byterange: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.segments[-1].start + self.segments[-1].duration if self.segments else 0
+
+def is_hls(url: str) -> bool:
+    return bool(url) and url.startswith(('http://', 'https://')) and '.m3u8' in urllib.parse.urlparse(url).path
+
+def _attrs(line: str) -> dict:
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(line.split(':', 1)[1])}
+
+def _get(url: str, timeout: int = 15) -> requests.Response:
+    r = http_clients.get(url, headers=HEADERS, timeout=timeout)
+    r.raise_for_status()
+    return r
+
+def pick_variant(master_url: str, text: str) -> Optional[str]:
+    """Return the lowest-bandwidth variant with height >= MIN_HEIGHT (or the lowest overall)"""
+    variants: List[Tuple[int, int, str]] = []
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    for i, line in enumerate(lines):
+        if line.startswith('#EXT-X-STREAM-INF') and i + 1 < len(lines) and not lines[i + 1].startswith('#'):
+            attrs = _attrs(line)
+            height = int(attrs.get('RESOLUTION', '0x0').split('x')[-1] or 0)
+            variants.append((int(attrs.get('BANDWIDTH', 0) or 0), height, urllib.parse.urljoin(master_url, lines[i + 1])))
+    if not variants:
+        return None
+    variants.sort()
+    usable = [v for v in variants if v[1] >= MIN_HEIGHT] or variants
+    return usable[0][2]
+
+def parse_media_playlist(url: str, text: str) -> MediaPlaylist:
+    playlist = MediaPlaylist()
+    position, pending = 0.0, None
+    for line in (l.strip() for l in text.splitlines()):
+        if not line:
+            continue
+        if line.startswith('#EXTINF:'):
+            pending = float(line[8:].split(',', 1)[0] or 0)
+        elif line.startswith('#EXT-X-MAP'):
+            playlist.init_uri = urllib.parse.urljoin(url, _attrs(line).get('URI', ''))
+        elif line.startswith('#EXT-X-KEY'):
+            playlist.encrypted = playlist.encrypted or _attrs(line).get('METHOD', 'NONE') != 'NONE'
+        elif line.startswith('#EXT-X-BYTERANGE'):
+            playlist.byterange = True
+        elif not line.startswith('#') and pending is not None:
+            playlist.segments.append(Segment(urllib.parse.urljoin(url, line), position, pending))
+            position += pending
+            pending = None
+    return playlist
+
+def load_media_playlist(url: str) -> Optional[MediaPlaylist]:
+    """Resolve a master or media playlist URL to the media playlist of the chosen variant"""
+    text = _get(url).text
+    if '#EXT-X-STREAM-INF' in text:
+        url = pick_variant(url, text)
+        if not url:
+            return None
+        text = _get(url).text
+    return parse_media_playlist(url, text)
+
+def fetch_window(url: str, start: float, window: float, dest_path: str) -> Optional[Tuple[float, float]]:
+    """
+    Download the segments covering [start, start + window] into dest_path.
+    Returns (offset of `start` inside the local file, playlist duration), or None
+    when the stream cannot be handled locally (encrypted, byte ranges, empty) -
+    the caller then falls back to letting ffmpeg read the remote URL.
+    """
+    try:
+        playlist = load_media_playlist(url)
+    except (requests.RequestException, ValueError) as e:
+        logger.info(f"HLS playlist fetch failed for {url}: {e}")
+        return None
+    if not playlist or not playlist.segments or playlist.encrypted or playlist.byterange:
+        return None
+
+    start = min(start, max(playlist.duration - window, 0))
+    end = start + window
+    wanted = [s for s in playlist.segments if s.start + s.duration > start and s.start < end][:MAX_SEGMENTS]
+    if not wanted:
+        wanted = playlist.segments[:1]
+
+    written = 0
+    try:
+        with open(dest_path, 'wb') as out:
+            # fMP4 streams need the init section in front of the first media segment;
+            # MPEG-TS segments can simply be concatenated
+            for uri in ([playlist.init_uri] if playlist.init_uri else []) + [s.uri for s in wanted]:
+                data = _get(uri, timeout=20).content
+                written += len(data)
+                if written > MAX_BYTES:
+                    raise ValueError("HLS window too large")
+                out.write(data)
+    except (requests.RequestException, OSError, ValueError) as e:
+        logger.info(f"HLS segment fetch failed for {url}: {e}")
+        return None
+    return max(start - wanted[0].start, 0), playlist.duration
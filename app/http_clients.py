@@ -0,0 +1,205 @@
+"""
+Shared outbound HTTP clients.
+Scrapers, thumbnail/subtitle downloads, HLS fetches and the stream proxy reuse
+keep-alive pools from here instead of opening a new connection (and TLS
+handshake) per request. Concurrency is capped per host, and host names are
+resolved through a TTL cache shared by all of them.
+"""
+import importlib.util
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import aiohttp
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+class DnsCache:
+    """
+    TTL cache in front of socket.getaddrinfo. Installed process-wide, because urllib3
+    (requests) and httpcore (httpx) resolve through the socket module and have no
+    resolver hook of their own; aiohttp's resolver ends up here as well.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._resolve = socket.getaddrinfo
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, tuple] = {}
+        self._stats = {"hits": 0, "misses": 0}
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._stats["hits"] += 1
+                return list(entry[1])
+            self._stats["misses"] += 1
+        # Failures are not cached, the next connection resolves again
+        result = self._resolve(*key)
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, result)
+        return list(result)
+
+    def install(self):
+        if self.ttl > 0:
+            socket.getaddrinfo = self.getaddrinfo
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "ttl": self.ttl, "cached": len(self._entries)}
+
+class HttpClients:
+    """Registry of pooled requests / httpx / aiohttp clients with per-host limits and stats"""
+
+    def __init__(self, per_host: int = None, proxy_per_host: int = None):
+        self.per_host = per_host or int(os.environ.get("VIP_HTTP_PER_HOST", 8))
+        self.proxy_per_host = proxy_per_host or int(os.environ.get("VIP_PROXY_PER_HOST", 32))
+        self.dns_ttl = int(os.environ.get("VIP_HTTP_DNS_TTL", 300))
+        self.dns = DnsCache(self.dns_ttl)
+        self.dns.install()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=self.per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._httpx: Optional[httpx.Client] = None
+        self.aiohttp: Optional[aiohttp.ClientSession] = None
+
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats: Dict[str, Dict] = {}
+
+    # --- Per-host accounting ---
+
+    def _host(self, url: str) -> str:
+        return urllib.parse.urlsplit(url).hostname or "unknown"
+
+    @contextmanager
+    def _track(self, url: str):
+        host = self._host(url)
+        with self._lock:
+            slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.per_host))
+            stats = self._stats.setdefault(host, {"requests": 0, "errors": 0, "in_flight": 0, "waited": 0, "total_seconds": 0.0})
+        if not slot.acquire(blocking=False):
+            with self._lock: stats["waited"] += 1
+            slot.acquire()
+        with self._lock: stats["in_flight"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            with self._lock: stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                stats["in_flight"] -= 1
+                stats["requests"] += 1
+                stats["total_seconds"] += time.monotonic() - started
+            slot.release()
+
+    # --- Sync clients (worker threads) ---
+
+    def _send(self, url: str, send, retries: int):
+        # Rate-limit wait happens before taking a per-host connection slot
+        for attempt in range(retries + 1):
+            rate_limiter.acquire(url)
+            with self._track(url):
+                resp = send()
+            cooldown = rate_limiter.report(url, resp.status_code, resp.headers.get("Retry-After"))
+            if cooldown is None or attempt == retries:
+                return resp
+            resp.close()
+        return resp
+
+    def request(self, method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+        """retries: how often a 429/503 answer is retried after the host's cooldown (GET only by default)"""
+        if retries is None:
+            retries = 2 if method == "GET" else 0
+        return self._send(url, lambda: self.session.request(method, url, **kwargs), retries)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    @property
+    def httpx_client(self) -> httpx.Client:
+        """HTTP/2 capable client for scrapers (HTTP/2 only when the h2 package is installed)"""
+        with self._lock:
+            if self._httpx is None:
+                self._httpx = httpx.Client(
+                    http2=importlib.util.find_spec("h2") is not None,
+                    timeout=20, follow_redirects=True,
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                )
+            return self._httpx
+
+    def httpx_get(self, url: str, retries: int = 2, **kwargs) -> httpx.Response:
+        return self._send(url, lambda: self.httpx_client.get(url, **kwargs), retries)
+
+    # --- Async client (stream proxy, downloads) ---
+
+    async def start_async(self):
+        if self.aiohttp is None or self.aiohttp.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.proxy_per_host,
+                                             ttl_dns_cache=self.dns_ttl, keepalive_timeout=30)
+            timeout = aiohttp.ClientTimeout(total=None, connect=60, sock_read=300)
+            self.aiohttp = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close_async(self):
+        if self.aiohttp is not None:
+            await self.aiohttp.close()
+            self.aiohttp = None
+
+    def close(self):
+        self.session.close()
+        with self._lock:
+            if self._httpx is not None:
+                self._httpx.close()
+                self._httpx = None
+
+    # --- Introspection ---
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hosts = {
+                host: {**s, "total_seconds": round(s["total_seconds"], 3),
+                       "avg_seconds": round(s["total_seconds"] / s["requests"], 3) if s["requests"] else None}
+                for host, s in self._stats.items()
+            }
+        # urllib3 keeps one pool per host; connections << requests means keep-alive is working
+        pools = {}
+        for adapter in set(self.session.adapters.values()):
+            manager = adapter.poolmanager
+            for key in list(manager.pools.keys()):
+                try: pool = manager.pools[key]
+                except KeyError: continue
+                pools[pool.host] = {"connections_opened": pool.num_connections, "requests": pool.num_requests}
+        return {
+            "per_host_limit": self.per_host,
+            "proxy_per_host_limit": self.proxy_per_host,
+            "hosts": hosts,
+            "pools": pools,
+            "dns": self.dns.get_stats(),
+            "aiohttp_open": self.aiohttp is not None and not self.aiohttp.closed,
+        }
+
+
+# Global instance
+http_clients = HttpClients()
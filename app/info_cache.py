@@ -0,0 +1,188 @@
+"""
+On-disk cache for yt-dlp info dicts, keyed by source_url.
+One extraction per URL is shared by import processing, JIT link refresh
+and the XVideos importer. Entries are gzip-compressed JSON with a TTL.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import yt_dlp
+
+from .rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "app/cache/ytdlp"
+COOKIE_FILE = "xvideos.cookies.txt"
+
+class _YdlErrorLog:
+    """yt-dlp logger keeping error lines - ignoreerrors swallows the exceptions themselves"""
+
+    def __init__(self):
+        self.errors = []
+
+    def debug(self, msg): pass
+    def info(self, msg): pass
+    def warning(self, msg): pass
+    def error(self, msg): self.errors.append(msg)
+
+    @property
+    def throttled(self) -> bool:
+        return any("HTTP Error 429" in e or "HTTP Error 503" in e for e in self.errors)
+
+def stream_url(info: Optional[Dict]) -> Optional[str]:
+    """Playable URL of an info dict (merged formats: the first requested one)"""
+    if not info:
+        return None
+    url = info.get('url')
+    if not url and info.get('requested_formats'):
+        url = info['requested_formats'][0].get('url')
+    return url
+
+class InfoCache:
+    """TTL cache of sanitized yt-dlp info dicts stored as .json.gz files"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl: int = None):
+        self.cache_dir = cache_dir
+        # Stream URLs inside the info dict are signed and expire, so keep the TTL in hours
+        self.ttl = ttl or int(os.environ.get("VIP_INFO_CACHE_TTL", 6 * 3600))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"hits": 0, "misses": 0, "extractions": 0, "failures": 0}
+
+    def _ydl_opts(self) -> Dict:
+        # One option set for every consumer, so a single extraction serves them all
+        opts = {
+            'quiet': True, 'skip_download': True, 'ignoreerrors': True, 'no_warnings': True,
+            'socket_timeout': 15,
+            'format': 'best/bestvideo+bestaudio',
+            'writesubtitles': True, 'writeautomaticsub': True,
+            'subtitleslangs': ['en'], 'subtitlesformat': 'vtt/best',
+            'http_headers': {'User-Agent': 'Mozilla/5.0'},
+        }
+        if os.path.exists(COOKIE_FILE):
+            opts['cookiefile'] = COOKIE_FILE
+        return opts
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.strip().encode('utf-8')).hexdigest()
+
+    def _path(self, url: str) -> str:
+        key = self._key(url)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, url: str, max_age: int = None) -> Optional[Dict]:
+        """Return the cached info dict if it is younger than max_age (default: TTL)"""
+        path = self._path(url)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if age > (max_age if max_age is not None else self.ttl):
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url: str, info: Dict):
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(info, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to cache info for {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def invalidate(self, url: str):
+        try: os.remove(self._path(url))
+        except OSError: pass
+
+    def extract(self, url: str, refresh: bool = False) -> Optional[Dict]:
+        """
+        Return the yt-dlp info dict for url, extracting it at most once per TTL.
+        refresh=True forces a new extraction (e.g. the cached stream URL died).
+        """
+        if not url:
+            return None
+        if not refresh:
+            cached = self.get(url)
+            if cached is not None:
+                self._count("hits")
+                return cached
+
+        key = self._key(url)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Concurrent workers asking for the same URL wait for one extraction
+        with key_lock:
+            try:
+                return self._extract_locked(url, refresh)
+            finally:
+                # Dropped only once the result is cached, so a late caller finds it on disk
+                with self._lock:
+                    if self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+
+    def _extract_locked(self, url: str, refresh: bool) -> Optional[Dict]:
+        if not refresh:
+            cached = self.get(url)
+            if cached is not None:
+                self._count("hits")
+                return cached
+        self._count("misses")
+        # One token per extraction - the site's per-host limit covers yt-dlp too
+        rate_limiter.acquire(url)
+        ydl_log = _YdlErrorLog()
+        try:
+            with yt_dlp.YoutubeDL({**self._ydl_opts(), 'logger': ydl_log}) as ydl:
+                info = ydl.extract_info(url, download=False)
+                info = ydl.sanitize_info(info) if info else None
+        except Exception as e:
+            logger.warning(f"yt-dlp extraction failed for {url}: {e}")
+            ydl_log.error(str(e))
+            info = None
+        rate_limiter.report(url, 429 if ydl_log.throttled else 200)
+
+        if not info:
+            self._count("failures")
+            return None
+        self._count("extractions")
+        self.put(url, info)
+        return info
+
+    def purge_expired(self) -> int:
+        """Delete entries older than the TTL. Returns number of removed files."""
+        removed = 0
+        now = time.time()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if now - os.path.getmtime(path) > self.ttl:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "ttl": self.ttl}
+
+
+# Global instance
+info_cache = InfoCache()
@@ -0,0 +1,251 @@
+"""
+Durable job queue backed by the SQLite `jobs` table.
+Replaces FastAPI BackgroundTasks for imports and reprocessing: jobs survive
+restarts, workers lease them with a heartbeat, and expired leases are
+re-queued (crash recovery) until max_attempts is reached.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+
+from .database import Job, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """In-process workers consuming the persistent jobs table"""
+
+    def __init__(self, workers: int = None, lease_seconds: int = None, poll_interval: float = 1.0):
+        self.workers = workers or int(os.environ.get("VIP_JOB_WORKERS", 2))
+        self.lease_seconds = lease_seconds or int(os.environ.get("VIP_JOB_LEASE_SECONDS", 120))
+        self.poll_interval = poll_interval
+        self.keep_done_days = 7
+        self.handlers: Dict[str, Callable[[dict], Optional[dict]]] = {}
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # --- Registration / producers ---
+
+    def handler(self, kind: str):
+        """Decorator registering the function that runs jobs of `kind`"""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    def enqueue(self, kind: str, payload: dict, priority: int = 0, max_attempts: int = 3, db=None, delay: float = 0) -> int:
+        """
+        Add a job. When `db` is given the job joins the caller's transaction
+        (committed together with the rows it refers to), otherwise it is committed here.
+        `delay` postpones the first run by that many seconds.
+        """
+        own_session = db is None
+        if own_session:
+            db = SessionLocal()
+        try:
+            job = Job(kind=kind, payload=payload, priority=priority, max_attempts=max_attempts, status="queued",
+                      run_after=datetime.utcnow() + timedelta(seconds=delay))
+            db.add(job)
+            db.flush()
+            job_id = job.id
+            if own_session:
+                db.commit()
+        finally:
+            if own_session:
+                db.close()
+        self._wake.set()
+        return job_id
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        recovered = self.recover()
+        if recovered:
+            logger.info(f"Recovered {recovered} jobs with expired leases")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, args=(f"{self.owner_prefix}:{i}",), name=f"vip-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Job queue started with {self.workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def recover(self) -> int:
+        """Re-queue jobs whose lease expired (worker crashed or process restarted)"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            expired = db.query(Job).filter(Job.status == "running", Job.lease_until < now).all()
+            for job in expired:
+                job.lease_owner = None
+                job.lease_until = None
+                job.updated_at = now
+                if job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                    job.last_error = "Lease expired (worker died) and no attempts left"
+                else:
+                    job.status = "queued"
+                    job.run_after = now
+            db.query(Job).filter(Job.status == "done", Job.updated_at < now - timedelta(days=self.keep_done_days)).delete(synchronize_session=False)
+            db.commit()
+            return len(expired)
+        except Exception as e:
+            logger.error(f"Job recovery failed: {e}")
+            db.rollback()
+            return 0
+        finally:
+            db.close()
+
+    # --- Worker internals ---
+
+    def _lease(self, owner: str) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            while True:
+                now = datetime.utcnow()
+                candidate = db.query(Job.id).filter(Job.status == "queued", Job.run_after <= now) \
+                    .order_by(Job.priority.desc(), Job.id).first()
+                if not candidate:
+                    return None
+                # Conditional update - only one worker wins the row
+                won = db.query(Job).filter(Job.id == candidate.id, Job.status == "queued").update({
+                    Job.status: "running",
+                    Job.lease_owner: owner,
+                    Job.lease_until: now + timedelta(seconds=self.lease_seconds),
+                    Job.attempts: Job.attempts + 1,
+                    Job.updated_at: now,
+                }, synchronize_session=False)
+                db.commit()
+                if won:
+                    job = db.query(Job).get(candidate.id)
+                    return {"id": job.id, "kind": job.kind, "payload": job.payload or {},
+                            "attempts": job.attempts, "max_attempts": job.max_attempts}
+        finally:
+            db.close()
+
+    def _heartbeat(self, job_id: int, owner: str, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            db = SessionLocal()
+            try:
+                db.query(Job).filter(Job.id == job_id, Job.lease_owner == owner).update({
+                    Job.lease_until: datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+                }, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+            finally:
+                db.close()
+
+    def _finish(self, job: dict, owner: str, result: Optional[dict] = None, error: Optional[str] = None):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            values = {Job.lease_owner: None, Job.lease_until: None, Job.updated_at: now}
+            if error is None:
+                values.update({Job.status: "done", Job.result: result, Job.last_error: None})
+            elif job["attempts"] < job["max_attempts"]:
+                backoff = min(300, 5 * 2 ** job["attempts"])
+                values.update({Job.status: "queued", Job.last_error: error[:1000], Job.run_after: now + timedelta(seconds=backoff)})
+            else:
+                values.update({Job.status: "failed", Job.last_error: error[:1000]})
+            # Only the current lease owner may finish the job
+            db.query(Job).filter(Job.id == job["id"], Job.lease_owner == owner).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _worker_loop(self, owner: str):
+        polls = 0
+        while not self._stop.is_set():
+            polls += 1
+            if owner.endswith(":0") and polls % 60 == 0:
+                self.recover()
+            try:
+                job = self._lease(owner)
+            except Exception as e:
+                logger.error(f"Job lease failed: {e}")
+                job = None
+            if not job:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            handler = self.handlers.get(job["kind"])
+            if not handler:
+                self._finish({**job, "attempts": job["max_attempts"]}, owner, error=f"No handler for job kind '{job['kind']}'")
+                continue
+
+            done = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job["id"], owner, done), daemon=True).start()
+            try:
+                result = handler(job["payload"])
+                self._finish(job, owner, result=result)
+            except Exception as e:
+                logger.error(f"Job {job['id']} ({job['kind']}) failed: {e}\n{traceback.format_exc()}")
+                self._finish(job, owner, error=str(e))
+            finally:
+                done.set()
+
+    # --- Introspection ---
+
+    def get_stats(self) -> Dict:
+        db = SessionLocal()
+        try:
+            rows = db.query(Job.kind, Job.status, func.count(Job.id)).group_by(Job.kind, Job.status).all()
+            by_status: Dict[str, int] = {}
+            by_kind: Dict[str, Dict[str, int]] = {}
+            for kind, status, count in rows:
+                by_status[status] = by_status.get(status, 0) + count
+                by_kind.setdefault(kind, {})[status] = count
+            return {"workers": self.workers, "by_status": by_status, "by_kind": by_kind}
+        finally:
+            db.close()
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        db = SessionLocal()
+        try:
+            query = db.query(Job)
+            if status:
+                query = query.filter(Job.status == status)
+            return [self._to_dict(j, include_payload=False) for j in query.order_by(Job.id.desc()).limit(limit).all()]
+        finally:
+            db.close()
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        db = SessionLocal()
+        try:
+            job = db.query(Job).get(job_id)
+            return self._to_dict(job) if job else None
+        finally:
+            db.close()
+
+    def _to_dict(self, job: Job, include_payload: bool = True) -> Dict:
+        data = {
+            "id": job.id, "kind": job.kind, "status": job.status, "priority": job.priority,
+            "attempts": job.attempts, "max_attempts": job.max_attempts,
+            "result": job.result, "last_error": job.last_error,
+            "created_at": job.created_at, "updated_at": job.updated_at,
+        }
+        if include_payload:
+            data["payload"] = job.payload
+        return data
+
+
+# Global instance
+job_queue = JobQueue()
@@ -0,0 +1,105 @@
+"""
+Event-loop hygiene for async endpoints.
+- run_blocking(): runs sync work (scrapers, yt-dlp, aria2 RPC) on a bounded
+  thread pool instead of the event loop.
+- LoopMonitor: a ticker task that measures how late the loop wakes up; stalls
+  above VIP_LOOP_LAG_MS are logged together with the HTTP handlers that were
+  in flight, so the blocking endpoint can be found.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_WORKERS = int(os.environ.get("VIP_BLOCKING_WORKERS", 8))
+blocking_pool = concurrent.futures.ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="vip-blocking")
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """Await a blocking call executed on the bounded blocking_pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_pool, functools.partial(fn, *args, **kwargs))
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.05, threshold_ms: float = None):
+        self.interval = interval
+        self.threshold_ms = threshold_ms or float(os.environ.get("VIP_LOOP_LAG_MS", 100))
+        self.in_flight: Dict[int, tuple] = {}
+        # The blocking handler has usually returned by the time the ticker wakes up,
+        # so recently finished requests are checked against the stall window too
+        self.finished = deque(maxlen=200)
+        self.stalls = deque(maxlen=50)
+        self.suspects: Counter = Counter()
+        self.max_lag_ms = 0.0
+        self.stall_count = 0
+        self.ticks = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- In-flight request tracking (pure ASGI, keeps streaming responses untouched) ---
+
+    def middleware(self, app):
+        async def tracked(scope, receive, send):
+            if scope["type"] != "http":
+                return await app(scope, receive, send)
+            token = id(scope)
+            self.in_flight[token] = (f"{scope['method']} {scope['path']}", time.monotonic())
+            try:
+                await app(scope, receive, send)
+            finally:
+                name, _ = self.in_flight.pop(token)
+                self.finished.append((name, time.monotonic()))
+        return tracked
+
+    # --- Lag ticker ---
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = (loop.time() - expected) * 1000
+            self.ticks += 1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms >= self.threshold_ms:
+                # loop.time() is time.monotonic(), so both can be compared directly
+                handlers = {name for name, _ in self.in_flight.values()}
+                handlers.update(name for name, ended in list(self.finished) if ended >= expected)
+                handlers = sorted(handlers)
+                self.stall_count += 1
+                self.suspects.update(handlers)
+                self.stalls.append({"at": time.time(), "lag_ms": round(lag_ms, 1), "in_flight": handlers})
+                logger.warning(f"Event loop blocked for {lag_ms:.0f} ms; in flight: {', '.join(handlers) or 'no HTTP handler'}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "stall_count": self.stall_count,
+            "recent_stalls": list(self.stalls)[-10:],
+            "suspects": dict(self.suspects.most_common(20)),
+            "in_flight": [{"handler": name, "seconds": round(time.monotonic() - started, 1)}
+                          for name, started in list(self.in_flight.values())],
+            "blocking_pool_workers": BLOCKING_WORKERS,
+        }
+
+
+# Global instance
+loop_monitor = LoopMonitor()
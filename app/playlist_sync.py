@@ -0,0 +1,181 @@
+"""
+Playlist expansion with an incremental sync cache.
+Pasted playlist URLs are expanded concurrently on a bounded pool, and the entry
+list of every playlist is stored in `playlist_syncs`. A re-import or scheduled
+sync walks the playlist lazily (page by page), stops after a run of entries it
+already knows and returns only the entries added since the last run. A known run
+at the very start of the playlist only ends the walk when the playlist cannot have
+grown - oldest-first playlists get their new entries at the end.
+"""
+import concurrent.futures
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import yt_dlp
+from yt_dlp.utils import PagedList
+
+from .database import PlaylistSync, SessionLocal
+from .info_cache import _YdlErrorLog
+from .rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_WORKERS = int(os.environ.get("VIP_PLAYLIST_WORKERS", 4))
+# Consecutive known entries that end an incremental walk (0 = always walk the whole playlist)
+KNOWN_STOP = int(os.environ.get("VIP_PLAYLIST_KNOWN_STOP", 10))
+# Re-sync all stored playlists every N hours (0 = only on re-import / manual sync)
+SYNC_HOURS = float(os.environ.get("VIP_PLAYLIST_SYNC_HOURS", 0))
+PAGE = 50
+
+def _iter_entries(entries):
+    # PagedList only supports slicing; lists, LazyLists and generators iterate directly
+    if isinstance(entries, PagedList):
+        start = 0
+        while True:
+            page = entries.getslice(start, start + PAGE)
+            if not page:
+                return
+            yield from page
+            start += PAGE
+    else:
+        yield from entries or []
+
+def _entry_url(entry) -> Optional[str]:
+    if not entry:
+        return None
+    if entry.get('_type') in ('url', 'url_transparent'):
+        return entry.get('url')
+    return entry.get('webpage_url') or entry.get('url')
+
+def list_entries(url: str, known: Optional[set] = None) -> Optional[Dict]:
+    """
+    Walk the playlist behind `url` without resolving its entries.
+    Returns {"playlist": bool, "title", "entries": [...], "complete": bool} or None when
+    extraction failed. With `known`, the walk stops after KNOWN_STOP consecutive known entries
+    that follow a new one (newest-first playlist) - or, when the playlist starts with known
+    entries, only if its reported length shows nothing was appended.
+    """
+    log = _YdlErrorLog()
+    opts = {'extract_flat': True, 'quiet': True, 'ignoreerrors': True, 'no_warnings': True, 'logger': log}
+    rate_limiter.acquire(url)
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            # process=False keeps `entries` lazy, so pages are fetched only while we walk
+            info = ydl.extract_info(url, download=False, process=False)
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+            if not info:
+                return None
+            if 'entries' not in info:
+                return {"playlist": False, "title": info.get('title'), "entries": [url], "complete": True}
+
+            entries, seen, known_run, complete = [], set(), 0, True
+            # Without a reported length an oldest-first playlist may have grown at the end
+            expected = info.get('playlist_count')
+            may_have_grown = known is not None and (expected is None or expected > len(known))
+            try:
+                for entry in _iter_entries(info['entries']):
+                    entry_url = _entry_url(entry)
+                    if not entry_url or entry_url in seen:
+                        continue
+                    seen.add(entry_url)
+                    entries.append(entry_url)
+                    if known is None:
+                        continue
+                    known_run = known_run + 1 if entry_url in known else 0
+                    if KNOWN_STOP and known_run >= KNOWN_STOP:
+                        if known_run == len(entries) and may_have_grown:
+                            # Known from the head on: new entries (if any) are appended - walk on
+                            continue
+                        complete = False
+                        break
+            except Exception as e:
+                # Keep what was listed so far; the next sync picks up the rest
+                logger.warning(f"Playlist walk of {url} stopped after {len(entries)} entries: {e}")
+                complete = False
+            return {"playlist": True, "title": info.get('title'), "entries": entries, "complete": complete}
+    except Exception as e:
+        logger.warning(f"Playlist extraction failed for {url}: {e}")
+        return None
+    finally:
+        rate_limiter.report(url, 429 if log.throttled else 200)
+
+def sync_playlist(url: str, parser: str = "yt-dlp", batch_name: Optional[str] = None) -> Dict:
+    """
+    Expand `url` against its sync record. Nothing is written here - the caller stores
+    the result with save_sync() in the same transaction as the videos it inserts, so
+    a failed import does not mark entries as known.
+    Returns {"url", "playlist", "new": [entry URLs not seen before], "total", "incremental", ...}.
+    A plain video URL yields itself; an unknown URL that fails to extract is kept as-is.
+    """
+    db = SessionLocal()
+    try:
+        record = db.query(PlaylistSync).filter(PlaylistSync.url == url).first()
+        old = list(record.entries or []) if record else []
+        if record:
+            parser, batch_name = record.parser or parser, record.batch_name
+    finally:
+        db.close()
+    known = set(old) if record else None
+    listing = list_entries(url, known)
+    result = {"url": url, "parser": parser, "batch_name": batch_name, "incremental": known is not None}
+
+    if listing is None or not listing["playlist"] or (known is None and not listing["entries"]):
+        return {**result, "playlist": known is not None, "new": [] if known is not None else [url],
+                "total": len(old), "entries": None}
+
+    new = [u for u in listing["entries"] if u not in known] if known is not None else listing["entries"]
+    if listing["complete"]:
+        entries = listing["entries"]
+    else:
+        walked = set(listing["entries"])
+        entries = listing["entries"] + [u for u in old if u not in walked]
+    return {**result, "playlist": True, "new": new, "total": len(entries), "entries": entries, "title": listing["title"]}
+
+def save_sync(db, result: Dict):
+    """Store a sync_playlist() result in the caller's transaction"""
+    if result.get("entries") is None:
+        return
+    record = db.query(PlaylistSync).filter(PlaylistSync.url == result["url"]).first()
+    if record is None:
+        record = PlaylistSync(url=result["url"], batch_name=result["batch_name"], parser=result["parser"])
+        db.add(record)
+    record.title = result["title"] or record.title
+    record.entries = result["entries"]
+    record.entry_count = len(result["entries"])
+    record.last_added = len(result["new"])
+    record.last_synced_at = datetime.utcnow()
+
+def expand_urls(urls: List[str], parser: str = "yt-dlp", batch_name: Optional[str] = None) -> List[Dict]:
+    """Expand many URLs concurrently (at most PLAYLIST_WORKERS at once); results keep the input order"""
+    if not urls:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(PLAYLIST_WORKERS, len(urls))),
+                                               thread_name_prefix="vip-playlist") as pool:
+        return list(pool.map(lambda u: sync_playlist(u, parser, batch_name), urls))
+
+def sync_stored(ids: Optional[List[int]] = None) -> List[Dict]:
+    """Incrementally expand stored playlists (all of them when `ids` is None)"""
+    db = SessionLocal()
+    try:
+        query = db.query(PlaylistSync.url)
+        if ids is not None:
+            query = query.filter(PlaylistSync.id.in_(ids))
+        urls = [r.url for r in query.order_by(PlaylistSync.id).all()]
+    finally:
+        db.close()
+    return expand_urls(urls)
+
+def list_playlists() -> List[Dict]:
+    db = SessionLocal()
+    try:
+        rows = db.query(PlaylistSync.id, PlaylistSync.url, PlaylistSync.title, PlaylistSync.batch_name,
+                        PlaylistSync.entry_count, PlaylistSync.last_added, PlaylistSync.last_synced_at) \
+            .order_by(PlaylistSync.id).all()
+        return [dict(r._mapping) for r in rows]
+    finally:
+        db.close()
@@ -0,0 +1,234 @@
+"""
+Shared library filters and pagination for /api/videos, /api/export and smart playlists
+(rules are validated and compiled to SQL conditions here, evaluated in app/smart_playlists.py).
+Text search goes through the `videos_fts` index (title, tags, ai_tags, batch_name)
+instead of leading-wildcard LIKEs, so it costs the number of matching videos, not
+the size of the library, and combines with the quality/duration/date filters.
+Pages are addressed by opaque keyset cursors over (sort key, id).
+"""
+import base64
+import datetime
+import json
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, asc, column, desc, false, literal_column, select, table, text, tuple_
+from sqlalchemy.orm import Query
+
+from .database import PLAYLIST_RULE_FIELDS, Video
+from .subtitle_index import RANK_CAP, fts_query
+from .tags import normalize_tag, tag_filter
+
+_videos_fts = table("videos_fts", column("rowid"), column("rank"))
+
+def search_hits(search: str):
+    """Subquery (video_id, rank) of the videos matching `search`, or None for an empty query"""
+    match = fts_query(search)
+    if not match:
+        return None
+    return select(_videos_fts.c.rowid.label("video_id"), _videos_fts.c.rank.label("rank")) \
+        .where(literal_column("videos_fts").op("MATCH")(match)).subquery("search_hits")
+
+def _rankable(query: Query, match: str) -> bool:
+    # bm25 scores every match; terms in most of the library are listed newest first instead
+    return query.session.execute(text(
+        "SELECT count(*) FROM (SELECT rowid FROM videos_fts WHERE videos_fts MATCH :match LIMIT :cap)"
+    ), {"match": match, "cap": RANK_CAP}).scalar() < RANK_CAP
+
+def _filtered(query: Query, search: str = "", batch: str = "All", favorites_only: bool = False,
+              quality: str = "All", duration_min: int = 0, duration_max: int = 99999,
+              dateMin: Optional[str] = None, dateMax: Optional[str] = None, tag: Optional[str] = None):
+    """Library filters without ordering -> (query, search hits subquery or None)"""
+    hits = search_hits(search) if search else None
+    if hits is not None:
+        query = query.join(hits, hits.c.video_id == Video.id)
+    elif search:
+        # Only punctuation - nothing can match
+        return query.filter(false()), None
+    if tag: query = query.filter(tag_filter([tag]))
+    if batch and batch != "All": query = query.filter(Video.batch_name == batch)
+    if favorites_only: query = query.filter(Video.is_favorite == True)
+    if duration_min > 0: query = query.filter(Video.duration >= duration_min)
+    if duration_max < 3600: query = query.filter(Video.duration <= duration_max)
+    if quality != "All":
+        if quality == "4K": query = query.filter(Video.height >= 2160)
+        elif quality == "1440p": query = query.filter(Video.height >= 1440, Video.height < 2160)
+        elif quality in ["1080p", "FHD"]: query = query.filter(Video.height >= 1080, Video.height < 1440)
+        elif quality in ["720p", "HD"]: query = query.filter(Video.height >= 720, Video.height < 1080)
+        elif quality == "SD": query = query.filter(Video.height < 720)
+
+    if dateMin:
+        try: query = query.filter(Video.created_at >= datetime.datetime.fromisoformat(dateMin))
+        except ValueError: pass
+    if dateMax:
+        try: query = query.filter(Video.created_at < datetime.datetime.fromisoformat(dateMax) + datetime.timedelta(days=1))
+        except ValueError: pass
+    return query, hits
+
+def _sort_keys(query: Query, sort: str, hits, search: str) -> Optional[List[Tuple]]:
+    """
+    [(column, Video attribute, ascending)] ending in the id tie-breaker, or None for
+    bm25 relevance (ranked on the fly, paged by position - at most RANK_CAP matches).
+    """
+    if sort == "relevance" and hits is not None and _rankable(query, fts_query(search)):
+        return None
+    if sort == "title_asc": return [(Video.title, "title", True), (Video.id, "id", True)]
+    if sort == "longest": return [(Video.duration, "duration", False), (Video.id, "id", False)]
+    if sort == "shortest": return [(Video.duration, "duration", True), (Video.id, "id", True)]
+    # Newest first straight from the index: FTS5 returns rowids in descending order without a sort
+    return [(hits.c.video_id if hits is not None else Video.id, "id", False)]
+
+def _order(query: Query, keys: Optional[List[Tuple]], hits) -> Query:
+    if keys is None:
+        # bm25 rank, lower = better
+        return query.order_by(asc(hits.c.rank), desc(Video.id))
+    return query.order_by(*(asc(col) if ascending else desc(col) for col, _, ascending in keys))
+
+def filter_videos(query: Query, search: str = "", batch: str = "All", favorites_only: bool = False,
+                  quality: str = "All", duration_min: int = 0, duration_max: int = 99999,
+                  sort: str = "date_desc", dateMin: Optional[str] = None, dateMax: Optional[str] = None,
+                  tag: Optional[str] = None) -> Query:
+    """Apply the library filters and sort order to a Video query"""
+    query, hits = _filtered(query, search, batch, favorites_only, quality, duration_min, duration_max, dateMin, dateMax, tag)
+    return _order(query, _sort_keys(query, sort, hits, search), hits)
+
+# --- Smart playlist rules ---
+
+RULE_OPERATORS = {
+    "text": ("contains", "not_contains", "equals", "not_equals"),
+    "tag": ("contains", "not_contains", "equals", "not_equals"),
+    "number": ("equals", "not_equals", "greater_than", "less_than"),
+    "bool": ("equals", "not_equals"),
+}
+_TRUE, _FALSE = ("1", "true", "yes"), ("0", "false", "no")
+
+def _check_rule(i: int, rule: Dict) -> Dict:
+    field, op = rule.get("field"), rule.get("operator")
+    value = "" if rule.get("value") is None else str(rule["value"])
+    kind = PLAYLIST_RULE_FIELDS.get(field)
+    if kind is None:
+        raise ValueError(f"Rule {i}: unknown field {field!r} ({', '.join(PLAYLIST_RULE_FIELDS)})")
+    if op not in RULE_OPERATORS[kind]:
+        raise ValueError(f"Rule {i}: {field} does not support {op!r} ({', '.join(RULE_OPERATORS[kind])})")
+    if kind != "text":
+        value = value.strip()
+    if kind == "number":
+        try: float(value)
+        except ValueError: raise ValueError(f"Rule {i}: {field} needs a number") from None
+    elif kind == "bool" and value.lower() not in _TRUE + _FALSE:
+        raise ValueError(f"Rule {i}: {field} needs true or false")
+    elif kind == "tag" and not normalize_tag(value):
+        raise ValueError(f"Rule {i}: {field} needs a tag")
+    return {"field": field, "operator": op, "value": value}
+
+def validate_rules(rules: List[Dict]) -> List[Dict]:
+    """Checked and normalized copy of smart playlist rules; ValueError names the first invalid rule"""
+    return [_check_rule(i, rule) for i, rule in enumerate(rules, 1)]
+
+def compile_rules(rules: List[Dict], skipped: Optional[List[str]] = None) -> List:
+    """
+    Smart playlist rules [{field, operator, value}] -> SQL conditions on Video.
+    Invalid rules raise ValueError, or - with a `skipped` list (stored playlists saved
+    before rules were validated) - are left out and their errors appended to it.
+    """
+    conditions = []
+    for i, rule in enumerate(rules, 1):
+        try:
+            rule = _check_rule(i, rule)
+        except ValueError as e:
+            if skipped is None:
+                raise
+            skipped.append(str(e))
+            continue
+        field, op, value = rule["field"], rule["operator"], rule["value"]
+        kind, col = PLAYLIST_RULE_FIELDS[field], getattr(Video, field)
+        if kind == "tag":
+            # Whole-tag match ("ass" no longer matches "class"), contains = has the tag
+            has_tag = tag_filter([value])
+            conditions.append(~has_tag if op.startswith("not_") else has_tag)
+            continue
+        if kind == "number":
+            value = float(value)
+        elif kind == "bool":
+            value = value.lower() in _TRUE
+        if op == "contains": conditions.append(col.contains(value, autoescape=True))
+        elif op == "not_contains": conditions.append(~col.contains(value, autoescape=True))
+        elif op == "equals": conditions.append(col == value)
+        elif op == "not_equals": conditions.append(col != value)
+        elif op == "greater_than": conditions.append(col > value)
+        elif op == "less_than": conditions.append(col < value)
+    return conditions
+
+def apply_playlist_rules(query: Query, rules: List[Dict]) -> Query:
+    """Smart playlist rules as filters on a Video query"""
+    return query.filter(*compile_rules(rules))
+
+# --- Cursor pagination ---
+
+def encode_cursor(data: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict:
+    """Opaque cursor -> dict; ValueError when it was not produced by encode_cursor()"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(data, dict):
+        raise ValueError("Invalid cursor")
+    return data
+
+def _after(keys: List[Tuple], values: List) -> Tuple:
+    """
+    Rows strictly after `values` in the (sort key, id) order as (head, tail) conditions:
+    `head` continues the current key range, `tail` (or None) is the range that follows it
+    - SQLite sorts NULL first, so non-null keys follow NULL ones ascending and precede
+    them descending. Two conditions instead of an OR keep both of them index seeks.
+    """
+    (col, _, ascending), (id_col, _, _) = keys[0], keys[-1]
+    if len(keys) == 1:
+        return (col > values[0] if ascending else col < values[0]), None
+    value, last_id = values
+    if ascending:
+        if value is None: return and_(col.is_(None), id_col > last_id), col.isnot(None)
+        # Row value comparison lets SQLite seek a (col, id) index
+        return tuple_(col, id_col) > tuple_(value, last_id), None
+    if value is None: return and_(col.is_(None), id_col < last_id), None
+    return tuple_(col, id_col) < tuple_(value, last_id), col.is_(None)
+
+def _page(rows: List[Video], limit: int, sort: str, keys: Optional[List[Tuple]], offset: int):
+    if len(rows) <= limit:
+        return rows, None
+    rows, last = rows[:limit], rows[limit - 1]
+    if keys is None:
+        return rows, encode_cursor({"s": sort, "o": offset + limit})
+    return rows, encode_cursor({"s": sort, "k": [getattr(last, attr) for _, attr, _ in keys]})
+
+def page_videos(query: Query, cursor: Optional[str] = None, limit: int = 10, page: int = 1,
+                sort: str = "date_desc", search: str = "", **filters) -> Tuple[List[Video], Optional[str]]:
+    """
+    One page of filtered videos and the cursor of the next page (None on the last one).
+    Keyset pagination over (sort key, id), so page N costs the same as page 1; `page`
+    (offset) is only used by clients that don't send a cursor.
+    """
+    query, hits = _filtered(query, search=search, **filters)
+    keys = _sort_keys(query, sort, hits, search)
+    offset = (max(page, 1) - 1) * limit
+    if cursor:
+        data = decode_cursor(cursor)
+        if data.get("s") != sort:
+            raise ValueError("Cursor belongs to another sort order")
+        if keys is None:
+            offset = data.get("o")
+            if not isinstance(offset, int) or offset < 0:
+                raise ValueError("Invalid cursor")
+        else:
+            values = data.get("k")
+            if not isinstance(values, list) or len(values) != len(keys) \
+                    or not all(v is None or isinstance(v, (int, float, str)) for v in values):
+                raise ValueError("Invalid cursor")
+            head, tail = _after(keys, values)
+            rows = _order(query.filter(head), keys, hits).limit(limit + 1).all()
+            if tail is not None and len(rows) <= limit:
+                rows += _order(query.filter(tail), keys, hits).limit(limit + 1 - len(rows)).all()
+            return _page(rows, limit, sort, keys, 0)
+    return _page(_order(query, keys, hits).offset(offset).limit(limit + 1).all(), limit, sort, keys, offset)
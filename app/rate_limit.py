@@ -0,0 +1,167 @@
+"""
+Per-host token-bucket rate limiter for scrapers and yt-dlp extraction.
+Each configured domain gets `qps` tokens per second with a `burst` allowance;
+429/503 answers put the host into a cooldown (Retry-After or exponential backoff).
+Hosts without a rule are not limited unless VIP_RATE_DEFAULT is set.
+"""
+import email.utils
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# domain=qps:burst, comma separated; subdomains share the bucket of their rule
+DEFAULT_RULES = "xvideos.com=2:4,eporner.com=4:8,coomer.st=1:3,coomer.su=1:3,pixeldrain.com=5:10"
+THROTTLE_STATUSES = (429, 503)
+
+def parse_rules(spec: str) -> Dict[str, Tuple[float, int]]:
+    rules = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        domain, rate = part.split("=", 1)
+        qps, _, burst = rate.partition(":")
+        try:
+            if float(qps) <= 0:
+                raise ValueError("qps must be positive")
+            rules[domain.strip().lower()] = (float(qps), int(burst or max(1, float(qps))))
+        except ValueError:
+            logger.warning(f"Ignoring invalid rate limit rule '{part}'")
+    return rules
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Not thread-safe by itself - RateLimiter serializes access"""
+
+    def __init__(self, qps: float, burst: int):
+        self.qps, self.burst = qps, burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.stats = {"acquired": 0, "delayed": 0, "wait_seconds": 0.0, "throttled": 0}
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return how long the caller has to wait for it"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.qps)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.qps if self.tokens < 0 else 0.0
+        wait = max(wait, self.cooldown_until - now)
+        self.stats["acquired"] += 1
+        if wait > 0:
+            self.stats["delayed"] += 1
+            self.stats["wait_seconds"] += wait
+        return wait
+
+class RateLimiter:
+    def __init__(self, rules: str = None, default: str = None):
+        self.rules = parse_rules(rules if rules is not None else os.environ.get("VIP_RATE_LIMITS", DEFAULT_RULES))
+        default = default if default is not None else os.environ.get("VIP_RATE_DEFAULT", "")
+        self.default = parse_rules(f"*={default}").get("*") if default else None
+        self.max_backoff = float(os.environ.get("VIP_RATE_MAX_BACKOFF", 300))
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket_key(self, url: str) -> Optional[str]:
+        host = (urllib.parse.urlsplit(url).hostname or "").lower()
+        for domain in self.rules:
+            if host == domain or host.endswith("." + domain):
+                return domain
+        return host if host and self.default else None
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            qps, burst = self.rules.get(key) or self.default
+            bucket = self._buckets[key] = TokenBucket(qps, burst)
+        return bucket
+
+    def acquire(self, url: str) -> float:
+        """Block until a request to url's host is allowed. Returns seconds waited."""
+        key = self._bucket_key(url)
+        if not key:
+            return 0.0
+        with self._lock:
+            wait = self._bucket(key).reserve(time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+        # A 429 may have arrived while this caller was waiting for its token
+        while True:
+            with self._lock:
+                remaining = self._buckets[key].cooldown_until - time.monotonic()
+            if remaining <= 0:
+                return wait
+            time.sleep(remaining)
+            wait += remaining
+
+    def report(self, url: str, status: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """Feed a response status back; 429/503 start a cooldown. Returns the cooldown length."""
+        key = self._bucket_key(url)
+        if not key:
+            return None
+        with self._lock:
+            bucket = self._bucket(key)
+            if status not in THROTTLE_STATUSES:
+                bucket.strikes = 0
+                return None
+            bucket.strikes += 1
+            bucket.stats["throttled"] += 1
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = 2 ** bucket.strikes
+            delay = min(delay, self.max_backoff)
+            bucket.cooldown_until = max(bucket.cooldown_until, time.monotonic() + delay)
+            # Drain the bucket so the burst does not fire again right after the cooldown
+            bucket.tokens = min(bucket.tokens, 0)
+        logger.warning(f"{key} answered {status}, backing off for {delay:.1f}s")
+        return delay
+
+    def update_config(self, rules: Dict[str, Dict]):
+        """rules: {domain: {"qps": float, "burst": int}}; existing buckets keep their state"""
+        with self._lock:
+            for domain, cfg in rules.items():
+                domain = domain.lower()
+                qps, burst = float(cfg["qps"]), int(cfg.get("burst") or max(1, cfg["qps"]))
+                self.rules[domain] = (qps, burst)
+                if domain in self._buckets:
+                    self._buckets[domain].qps, self._buckets[domain].burst = qps, burst
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            hosts = {}
+            for key, b in self._buckets.items():
+                b.tokens = min(b.burst, b.tokens + (now - b.updated) * b.qps)
+                b.updated = now
+                hosts[key] = {
+                    "qps": b.qps, "burst": b.burst, "tokens": round(b.tokens, 2),
+                    "cooldown_seconds": round(max(0.0, b.cooldown_until - now), 1),
+                    **b.stats, "wait_seconds": round(b.stats["wait_seconds"], 2),
+                }
+            return {
+                "rules": {d: {"qps": q, "burst": bu} for d, (q, bu) in self.rules.items()},
+                "default": {"qps": self.default[0], "burst": self.default[1]} if self.default else None,
+                "hosts": hosts,
+            }
+
+
+# Global instance
+rate_limiter = RateLimiter()
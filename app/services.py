@@ -2,23 +2,26 @@ import os
 import ffmpeg
 import concurrent.futures
 import urllib.parse
-import yt_dlp
 import glob
 import logging
 import subprocess
 from sqlalchemy.orm import Session
-from .database import Video, SessionLocal
-from .websockets import manager # Import the manager
+from .database import Video, SessionLocal, StatsCounter
+from .websockets import status_bus
+from .info_cache import info_cache, stream_url as info_stream_url
+from .jobs import job_queue
+from .hls import is_hls, fetch_window
+from .http_clients import http_clients
+from .subtitle_index import parse_vtt, replace_cues, search_cues
+from .tags import list_tags
 import re
-import requests
 from bs4 import BeautifulSoup
 import time
-import httpx
 import json
 import shutil
-from sqlalchemy import func
-from collections import Counter
-import asyncio
+import threading
+import tempfile
+from typing import List, Optional
 
 # --- Eporner API import ---
 def fetch_eporner_videos(query=None, page=1, per_page=20, tags=None, gay=None, hd=None, pornstar=None, order=None):
@@ -34,7 +37,7 @@ def fetch_eporner_videos(query=None, page=1, per_page=20, tags=None, gay=None, h
     if pornstar: params["pornstar"] = pornstar
     if order: params["order"] = order
     try:
-        resp = requests.get(base_url, params=params, timeout=15)
+        resp = http_clients.get(base_url, params=params, timeout=15)
         resp.raise_for_status()
         data = resp.json()
     except Exception as e:
@@ -69,7 +72,7 @@ def fetch_eporner_playlist(playlist_url):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
-        resp = requests.get(playlist_url, headers=headers, timeout=15)
+        resp = http_clients.get(playlist_url, headers=headers, timeout=15)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, 'html.parser')
         
@@ -133,38 +136,197 @@ FFMPEG_NETWORK_ARGS = [
     '-timeout', '20000000', '-user_agent', 'Mozilla/5.0'
 ]
 
+def ffmpeg_input(url):
+    """
+    Resolve a video URL for ffmpeg. Returns (input_url, common_args):
+    local files become absolute paths, remote URLs get the network/reconnect args.
+    """
+    common_args = [FFMPEG_CMD, '-y', '-hide_banner', '-loglevel', 'error']
+    is_local = url.startswith('/static/') or (not url.startswith('http://') and not url.startswith('https://'))
+    if not is_local:
+        return url, common_args + FFMPEG_NETWORK_ARGS
+    if url.startswith('/static/'):
+        return os.path.abspath(os.path.join(os.getcwd(), url.lstrip('/'))), common_args
+    return (os.path.abspath(url) if not os.path.isabs(url) else url), common_args
+
+# Visuals: seconds decoded after the seek point for the thumbnail, hover clip and the
+# first preview frames (the storyboard pass replaces them with frames spread over the video)
+VISUALS_WINDOW = float(os.environ.get("VIP_VISUALS_WINDOW", 20))
+PREVIEW_FRAMES = int(os.environ.get("VIP_PREVIEW_FRAMES", 4))
+# Hover preview clip stored in gif_preview_path: mp4 (muted H.264), webp (animated) or gif (legacy palettegen)
+PREVIEW_FORMATS = ("mp4", "webp", "gif")
+PREVIEW_FORMAT = os.environ.get("VIP_PREVIEW_FORMAT", "mp4").lower()
+if PREVIEW_FORMAT not in PREVIEW_FORMATS: PREVIEW_FORMAT = "mp4"
+PREVIEW_CLIP_SECONDS, PREVIEW_CLIP_FPS = 2, 15
+# Queue a low-priority scrub-bar storyboard job after each default-speed import
+STORYBOARD_AUTO = os.environ.get("VIP_STORYBOARD_AUTO", "1") == "1"
+
+def preview_clip_name(vid_id, fmt: str = None) -> str:
+    return f"thumb_{vid_id}.{fmt or PREVIEW_FORMAT}"
+
+def preview_clip_graph(fmt: str, src: str = "clip_in", dst: str = "clip") -> str:
+    """Filter chain turning the source into a short looping hover clip"""
+    chain = f"trim=duration={PREVIEW_CLIP_SECONDS},setpts=PTS-STARTPTS,fps={PREVIEW_CLIP_FPS},scale=320:-2"
+    if fmt == "gif":
+        return f"[{src}]{chain},split[ga][gb];[ga]palettegen[pal];[gb][pal]paletteuse[{dst}]"
+    return f"[{src}]{chain}[{dst}]"
+
+def preview_clip_codec_args(fmt: str) -> List[str]:
+    if fmt == "mp4":
+        return ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '30', '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-an']
+    if fmt == "webp":
+        return ['-c:v', 'libwebp_anim', '-quality', '60', '-compression_level', '4', '-loop', '0']
+    return ['-loop', '0']
+
 import spacy
 try: NLP = spacy.load('en_core_web_sm')
 except OSError: NLP = None
 
+# --- Ingest Pipeline ---
+
+class IngestPipeline:
+    """
+    Staged worker pool for batch imports.
+    Network-bound work (scrapers, yt-dlp, thumbnail download) and CPU-bound work
+    (ffprobe, ffmpeg) run in separately sized pools, so a video can be probed
+    while the next ones are still waiting on the network.
+    """
+
+    STAGES = ("network", "cpu")
+
+    def __init__(self, network_workers: int = None, cpu_workers: int = None):
+        self.network_workers = network_workers or int(os.environ.get("VIP_NETWORK_WORKERS", 8))
+        self.cpu_workers = cpu_workers or int(os.environ.get("VIP_CPU_WORKERS", os.cpu_count() or 2))
+        self._lock = threading.Lock()
+        self._network_pool = self._make_pool(self.network_workers, "vip-net")
+        self._cpu_pool = self._make_pool(self.cpu_workers, "vip-cpu")
+        self._started_at = time.time()
+        self._counters = {stage: {"queued": 0, "active": 0, "completed": 0, "failed": 0, "busy_seconds": 0.0} for stage in self.STAGES}
+        self._videos_done = 0
+
+    @staticmethod
+    def _make_pool(workers, prefix):
+        return concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=prefix)
+
+    def _run_stage(self, stage, fn, *args, **kwargs):
+        with self._lock:
+            self._counters[stage]["queued"] -= 1
+            self._counters[stage]["active"] += 1
+        started = time.time()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                c = self._counters[stage]
+                c["active"] -= 1
+                c["busy_seconds"] += time.time() - started
+                c["completed" if ok else "failed"] += 1
+
+    def _submit(self, stage, fn, *args, **kwargs):
+        with self._lock:
+            pool = self._network_pool if stage == "network" else self._cpu_pool
+            self._counters[stage]["queued"] += 1
+            return pool.submit(self._run_stage, stage, fn, *args, **kwargs)
+
+    def run_batch(self, processor, video_ids, **kwargs):
+        """Run both stages for every video and block until the whole batch is done."""
+        network_futures = [
+            self._submit("network", processor._network_stage, video_id, **kwargs)
+            for video_id in video_ids
+        ]
+        cpu_futures = []
+        for future in concurrent.futures.as_completed(network_futures):
+            try:
+                job = future.result()
+            except Exception as e:
+                logging.error(f"Network stage crashed: {e}")
+                continue
+            if job:
+                cpu_futures.append(self._submit("cpu", processor._cpu_stage, job))
+            else:
+                with self._lock: self._videos_done += 1
+
+        for future in concurrent.futures.as_completed(cpu_futures):
+            try: future.result()
+            except Exception as e: logging.error(f"CPU stage crashed: {e}")
+            with self._lock: self._videos_done += 1
+
+    def update_config(self, network_workers: int = None, cpu_workers: int = None):
+        """Resize the pools. Work already submitted finishes on the old pool."""
+        with self._lock:
+            if network_workers and network_workers != self.network_workers:
+                old, self._network_pool = self._network_pool, self._make_pool(network_workers, "vip-net")
+                self.network_workers = network_workers
+                old.shutdown(wait=False)
+            if cpu_workers and cpu_workers != self.cpu_workers:
+                old, self._cpu_pool = self._cpu_pool, self._make_pool(cpu_workers, "vip-cpu")
+                self.cpu_workers = cpu_workers
+                old.shutdown(wait=False)
+        logging.info(f"Ingest pipeline resized: network={self.network_workers}, cpu={self.cpu_workers}")
+
+    def get_config(self):
+        return {"network_workers": self.network_workers, "cpu_workers": self.cpu_workers}
+
+    def get_stats(self):
+        with self._lock:
+            uptime = max(time.time() - self._started_at, 1e-6)
+            stages = {}
+            for stage, c in self._counters.items():
+                finished = c["completed"] + c["failed"]
+                stages[stage] = {
+                    **{k: v for k, v in c.items() if k != "busy_seconds"},
+                    "avg_seconds": round(c["busy_seconds"] / finished, 3) if finished else 0,
+                }
+            return {
+                **self.get_config(),
+                "stages": stages,
+                "videos_done": self._videos_done,
+                "videos_per_minute": round(self._videos_done * 60 / uptime, 2),
+                "uptime_seconds": int(uptime),
+            }
+
+ingest_pipeline = IngestPipeline()
+
 # --- Hlavná trieda ---
 
 class VIPVideoProcessor:
-    async def _broadcast_status(self, video_id: int, status: str, extra_data: dict = None):
-        message = {"type": "status_update", "video_id": video_id, "status": status}
+    def _broadcast_status(self, video_id: int, status: str, extra_data: dict = None, batch_name: str = None):
+        # Called from worker threads - the bus hands the message over to the server loop.
+        # batch_name lets clients subscribed to a batch topic receive the update.
+        message = {"type": "status_update", "video_id": video_id, "status": status, "batch_name": batch_name}
         if extra_data:
             message.update(extra_data)
-        await manager.broadcast(json.dumps(message))
+        status_bus.publish(message)
 
     def process_batch(self, video_ids: list[int], import_speed: str = "default"):
-        # Note: This is synchronous. For fully async, this would need a task queue.
-        for video_id in video_ids:
-            self.process_single_video(video_id, import_speed=import_speed)
+        # Network and ffmpeg work run in separate pools (see IngestPipeline)
+        ingest_pipeline.run_batch(self, video_ids, import_speed=import_speed)
 
     def process_single_video(self, video_id, force=False, quality_mode="mp4", extractor="auto", import_speed="default"):
+        job = self._network_stage(video_id, force=force, quality_mode=quality_mode, extractor=extractor, import_speed=import_speed)
+        if job: self._cpu_stage(job)
+
+    def _network_stage(self, video_id, force=False, quality_mode="mp4", extractor="auto", import_speed="default"):
+        """
+        Stage 1 (network-bound): scrapers, yt-dlp and thumbnail download.
+        Returns a job dict for the CPU stage, or None if there is nothing left to do.
+        """
         print(f"VIPVideoProcessor: Processing ID {video_id}...")
         db = SessionLocal()
         try:
             video = db.query(Video).get(video_id)
-            if not video: return
+            if not video: return None
 
             thumb_exists = video.thumbnail_path and os.path.exists(f"app{video.thumbnail_path}")
             if not force and video.status == 'ready' and thumb_exists:
-                db.close(); return
+                return None
 
             video.status = "processing"
             db.commit()
-            asyncio.run(self._broadcast_status(video_id, "processing"))
+            self._broadcast_status(video_id, "processing", batch_name=video.batch_name)
 
             # Check if this is a local file (not a remote URL)
             is_local_file = (video.url.startswith('/static/') or 
@@ -199,7 +361,7 @@ class VIPVideoProcessor:
             # 1.5 Generic Scraper (skip for local files)
             if not is_local_file and not is_direct_file and not stream_url and extractor == 'auto':
                 logging.info(f"Running generic scraper for {video.url}")
-                scraped_meta, scraped_stream_url = asyncio.run(self._scrape_generic_video_page(video.url))
+                scraped_meta, scraped_stream_url = self._scrape_generic_video_page(video.url)
                 if scraped_stream_url:
                     stream_url = scraped_stream_url
                     video.url = scraped_stream_url  # Update URL to the direct stream
@@ -228,24 +390,68 @@ class VIPVideoProcessor:
 
                 if should_run_ytdlp:
                     try:
-                        info_id = yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True, 'ignoreerrors': True}).extract_info(video.url, download=False)
-                        yt_id = info_id.get('id') if info_id else None
-                        
-                        dlp_meta, fetched_stream_url = self._fetch_metadata(video.url, yt_id, quality_mode)
+                        # Single cached extraction (shared with link refresh and the XVideos importer)
+                        dlp_meta, fetched_stream_url, yt_id = self._fetch_metadata(video.source_url or video.url, quality_mode)
                         
+                        requested_subtitles = dlp_meta.pop('requested_subtitles', None)
+                        if yt_id and import_speed not in ("turbo", "fast"):
+                            self._save_subtitles(requested_subtitles, yt_id)
+
                         if fetched_stream_url and not meta.get('stream_url'): # Don't overwrite if scraper got it
                             stream_url = fetched_stream_url
                         
                         meta.update(dlp_meta)
                     except Exception as e: logging.warning(f"yt-dlp failed: {e}")
-            
-            # 3. FFprobe - Skip in turbo mode if we have basic metadata
+
+            # 4. Thumbnail download from scraper / Pixeldrain (ffmpeg fallback runs in the CPU stage)
+            visuals_ok = False
+            timeout = 5 if import_speed == "turbo" else 10  # Shorter timeout in turbo mode
+            if meta.get('thumbnail_url'):
+                try:
+                    thumb_resp = http_clients.get(meta['thumbnail_url'], timeout=timeout)
+                    if thumb_resp.status_code == 200:
+                        thumb_path = os.path.join(THUMB_DIR, f"thumb_{video_id}.jpg")
+                        with open(thumb_path, 'wb') as f:
+                            f.write(thumb_resp.content)
+                        visuals_ok = True
+                except Exception as e:
+                    logging.warning(f"Failed to download thumbnail from URL {meta['thumbnail_url']}: {e}")
+
+            if import_speed != "turbo" and not visuals_ok and is_pixeldrain and pd_id and extractor == "auto":
+                if self._download_pixeldrain_thumbnail(video_id, pd_id): visuals_ok = True
+
+            db.commit()
+            return {
+                "video_id": video_id, "stream_url": stream_url, "meta": meta, "yt_id": yt_id,
+                "is_local_file": is_local_file, "is_direct_file": is_direct_file,
+                "visuals_ok": visuals_ok, "extractor": extractor, "import_speed": import_speed,
+            }
+
+        except Exception as e:
+            self._mark_error(db, video_id, e)
+            return None
+        finally: 
+            db.close()
+
+    def _cpu_stage(self, job):
+        """
+        Stage 2 (CPU-bound): ffprobe, tagging and ffmpeg thumbnail/GIF generation.
+        """
+        video_id = job["video_id"]
+        stream_url, meta, yt_id = job["stream_url"], job["meta"], job["yt_id"]
+        import_speed, extractor = job["import_speed"], job["extractor"]
+        db = SessionLocal()
+        try:
+            video = db.query(Video).get(video_id)
+            if not video: return
+
+            # 5. FFprobe - Skip in turbo mode if we have basic metadata
             if import_speed == "turbo" and meta.get('duration'):
                 pass  # Skip ffprobe if we already have duration
             elif not meta.get('duration') or extractor == "ffprobe":
                 meta = self._ffprobe_fallback(stream_url, meta)
 
-            # 4. Názov a Tagy
+            # 6. Názov a Tagy
             new_title = meta.get('title')
             if new_title and not ("hls-" in new_title or new_title.startswith("video")): video.title = new_title
             
@@ -261,85 +467,70 @@ class VIPVideoProcessor:
             video.ai_tags = self._generate_ai_tags(video.title, meta.get('description', ''))
             
             # Subtitles - Skip in turbo/fast mode
-            if import_speed != "turbo" and import_speed != "fast" and not is_local_file and not is_direct_file and yt_id:
-                video.subtitle = self._read_and_clean_vtt(yt_id)
+            if import_speed != "turbo" and import_speed != "fast" and not job["is_local_file"] and not job["is_direct_file"] and yt_id:
+                cues = self._read_vtt_cues(yt_id)
+                video.subtitle = " ".join(t for _, _, t in cues)
+                replace_cues(db, video_id, cues)
 
-            # 5. Vizuály - Different strategies based on import_speed
-            visuals_ok = False
-            
-            # Turbo mode: Only try scraper thumbnail, skip ffmpeg generation
-            if import_speed == "turbo":
-                if meta.get('thumbnail_url'):
-                    try:
-                        thumb_resp = requests.get(meta['thumbnail_url'], timeout=5)  # Shorter timeout
-                        if thumb_resp.status_code == 200:
-                            thumb_path = os.path.join(THUMB_DIR, f"thumb_{video_id}.jpg")
-                            with open(thumb_path, 'wb') as f:
-                                f.write(thumb_resp.content)
-                            visuals_ok = True
-                    except Exception as e:
-                        logging.warning(f"Failed to download thumbnail from URL: {e}")
-                # Skip ffmpeg thumbnail generation in turbo mode
-            else:
-                # Default and Fast mode: Full thumbnail generation
-                # Use scraper thumbnail if available
-                if meta.get('thumbnail_url'):
-                    try:
-                        thumb_resp = requests.get(meta['thumbnail_url'], timeout=10)
-                        if thumb_resp.status_code == 200:
-                            thumb_path = os.path.join(THUMB_DIR, f"thumb_{video_id}.jpg")
-                            with open(thumb_path, 'wb') as f:
-                                f.write(thumb_resp.content)
-                            visuals_ok = True
-                    except Exception as e:
-                        logging.error(f"Failed to download thumbnail from URL {meta['thumbnail_url']}: {e}")
-
-                if not visuals_ok and is_pixeldrain and pd_id and extractor == "auto":
-                    if self._download_pixeldrain_thumbnail(video_id, pd_id): visuals_ok = True
-                
-                if not visuals_ok:
-                    try:
-                        # Fast mode: Skip GIF generation
-                        self._generate_visuals(stream_url, video_id, video.duration, skip_gif=(import_speed == "fast"))
-                        visuals_ok = True
-                    except Exception as e: logging.error(f"Visuals gen failed for {video_id}: {e}")
+            # 7. Vizuály - Turbo mode skips ffmpeg generation entirely
+            if import_speed != "turbo" and not job["visuals_ok"]:
+                try:
+                    # Fast mode: Skip hover clip generation
+                    self._generate_visuals(stream_url, video_id, video.duration, skip_clip=(import_speed == "fast"))
+                except Exception as e: logging.error(f"Visuals gen failed for {video_id}: {e}")
 
             if os.path.exists(os.path.join(THUMB_DIR, f"thumb_{video_id}.jpg")):
                 video.thumbnail_path = f"/static/thumbnails/thumb_{video_id}.jpg"
             
-            # GIF preview - Skip in fast and turbo mode
+            # Hover preview clip - Skip in fast and turbo mode
             if import_speed != "fast" and import_speed != "turbo":
-                gif_preview_path = os.path.join(THUMB_DIR, f"thumb_{video_id}.gif")
-                if os.path.exists(gif_preview_path):
-                    video.gif_preview_path = f"/static/thumbnails/thumb_{video_id}.gif"
+                if os.path.exists(os.path.join(THUMB_DIR, preview_clip_name(video_id))):
+                    video.gif_preview_path = f"/static/thumbnails/{preview_clip_name(video_id)}"
+                    # Drop clips left over from a previous preview format
+                    for fmt in PREVIEW_FORMATS:
+                        stale = os.path.join(THUMB_DIR, preview_clip_name(video_id, fmt))
+                        if fmt != PREVIEW_FORMAT and os.path.exists(stale): os.remove(stale)
 
             video.preview_path = f"/static/previews/{video_id}"
             video.status = "ready"
             video.error_msg = None
+            if STORYBOARD_AUTO and import_speed not in ("turbo", "fast") and video.duration:
+                job_queue.enqueue("storyboard", {"video_ids": [video_id]}, priority=-10, db=db)
             db.commit()
 
             # Broadcast READY status with final data
-            asyncio.run(self._broadcast_status(video_id, "ready", {
+            self._broadcast_status(video_id, "ready", {
                 "title": video.title,
                 "thumbnail_path": video.thumbnail_path
-            }))
+            }, batch_name=video.batch_name)
 
         except Exception as e:
-            logging.error(f"Error processing video {video_id}: {e}")
-            video.status = "error"
-            video.error_msg = str(e)
-            db.commit()
-            # Broadcast ERROR status
-            asyncio.run(self._broadcast_status(video_id, "error", {"error": str(e)}))
-        finally: 
+            self._mark_error(db, video_id, e)
+        finally:
             db.close()
 
+    def _mark_error(self, db, video_id, e):
+        logging.error(f"Error processing video {video_id}: {e}")
+        batch_name = None
+        try:
+            db.rollback()
+            video = db.query(Video).get(video_id)
+            if video:
+                video.status = "error"
+                video.error_msg = str(e)
+                batch_name = video.batch_name
+                db.commit()
+        except Exception as db_err:
+            logging.error(f"Failed to store error state for video {video_id}: {db_err}")
+        # Broadcast ERROR status
+        self._broadcast_status(video_id, "error", {"error": str(e)}, batch_name=batch_name)
+
     # --- POMOCNÉ METÓDY ---
 
     def _fetch_pixeldrain_info_api(self, pd_id):
         try:
             url = f"https://pixeldrain.com/api/file/{pd_id}/info"
-            resp = requests.get(url, timeout=5)
+            resp = http_clients.get(url, timeout=5)
             if resp.status_code == 200: return resp.json()
         except: pass
         return None
@@ -349,67 +540,53 @@ class VIPVideoProcessor:
         Specialized extractor for XVideos using yt-dlp as parser (no download).
         Returns JSON metadata with best HLS stream.
         """
-        import yt_dlp
-        
-        # Options matching the requirements
-        ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-            'dump_single_json': True,
-            'extract_flat': False, # We need full info to get formats
-            'format': 'bv*', # We will filter manually later, but this hints preference
-            'cookiefile': 'xvideos.cookies.txt',
-            'ignoreerrors': True,
-            'no_warnings': True,
-        }
-
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    return None
-
-                # Extract basic metadata
-                video_id = info.get('id')
-                title = info.get('title')
-                duration = info.get('duration')
-                thumbnail = info.get('thumbnail')
-                
-                # Find best HLS stream
-                formats = info.get('formats', [])
-                hls_formats = []
-                
-                for f in formats:
-                    # Check for HLS m3u8
-                    if 'm3u8' in f.get('protocol', '') or 'm3u8' in f.get('ext', '') or 'hls' in f.get('format_id', '').lower():
-                        hls_formats.append(f)
-                
-                best_hls = None
-                if hls_formats:
-                    # Sort by height (resolution) descending
-                    hls_formats.sort(key=lambda x: x.get('height', 0) or 0, reverse=True)
-                    best_hls = hls_formats[0]
-                
-                if not best_hls:
-                    # Fallback: check if 'url' in info points to m3u8 directly (sometimes happens)
-                    if info.get('url', '').endswith('.m3u8'):
-                         best_hls = {'url': info['url'], 'height': info.get('height'), 'fps': info.get('fps')}
-                    else:
-                        return None # Requirement: "Pre XVideos VŽDY: používať HLS"
+            # Full info (with formats) comes from the shared on-disk cache
+            info = info_cache.extract(url)
+            if not info:
+                return None
 
-                return {
-                    "source": "xvideos",
-                    "id": video_id,
-                    "title": title,
-                    "duration": duration,
-                    "thumbnail": thumbnail,
-                    "stream": {
-                        "type": "hls",
-                        "url": best_hls.get('url'),
-                        "height": best_hls.get('height'),
-                        "fps": best_hls.get('fps')
-                    }
+            # Extract basic metadata
+            video_id = info.get('id')
+            title = info.get('title')
+            duration = info.get('duration')
+            thumbnail = info.get('thumbnail')
+            
+            # Find best HLS stream
+            formats = info.get('formats', [])
+            hls_formats = []
+            
+            for f in formats:
+                # Check for HLS m3u8
+                if 'm3u8' in f.get('protocol', '') or 'm3u8' in f.get('ext', '') or 'hls' in f.get('format_id', '').lower():
+                    hls_formats.append(f)
+            
+            best_hls = None
+            if hls_formats:
+                # Sort by height (resolution) descending
+                hls_formats.sort(key=lambda x: x.get('height', 0) or 0, reverse=True)
+                best_hls = hls_formats[0]
+            
+            if not best_hls:
+                # Fallback: check if 'url' in info points to m3u8 directly (sometimes happens)
+                if info.get('url', '').endswith('.m3u8'):
+                     best_hls = {'url': info['url'], 'height': info.get('height'), 'fps': info.get('fps')}
+                else:
+                    return None # Requirement: "Pre XVideos VŽDY: používať HLS"
+
+            return {
+                "source": "xvideos",
+                "id": video_id,
+                "title": title,
+                "duration": duration,
+                "thumbnail": thumbnail,
+                "stream": {
+                    "type": "hls",
+                    "url": best_hls.get('url'),
+                    "height": best_hls.get('height'),
+                    "fps": best_hls.get('fps')
                 }
+            }
         except Exception as e:
             logging.error(f"XVideos extraction failed for {url}: {e}")
             return None
@@ -420,7 +597,7 @@ class VIPVideoProcessor:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
-            resp = requests.get(url, headers=headers, timeout=15)
+            resp = http_clients.get(url, headers=headers, timeout=15)
             resp.raise_for_status()
             soup = BeautifulSoup(resp.text, 'html.parser')
 
@@ -492,72 +669,66 @@ class VIPVideoProcessor:
             logging.warning(f"Xvideos scraping failed for {url}: {e}")
             return {}, None
 
-    async def _scrape_generic_video_page(self, url):
+    def _scrape_generic_video_page(self, url):
         meta = {}
         stream_url = None
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
         
         try:
-            async with httpx.AsyncClient(http2=True, timeout=20, follow_redirects=True) as client:
-                resp = await client.get(url, headers=headers)
-                resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, 'html.parser')
+            resp = http_clients.httpx_get(url, headers=headers)
+            resp.raise_for_status()
+            soup = BeautifulSoup(resp.text, 'html.parser')
 
-                # --- Find Title ---
-                og_title = soup.find('meta', property='og:title')
-                if og_title and og_title.get('content'):
-                    meta['title'] = og_title['content']
-                else:
-                    title_tag = soup.find('title')
-                    if title_tag:
-                        meta['title'] = title_tag.text.strip()
-
-                # --- Find Video Stream ---
-                # Look for <video> tag src
-                video_tag = soup.find('video')
-                if video_tag and video_tag.get('src'):
-                    stream_url = urllib.parse.urljoin(url, video_tag['src'])
-                
-                # Look for HLS (.m3u8) links if no video tag found
-                if not stream_url:
-                    links = soup.find_all('a', href=True)
-                    for link in links:
-                        if '.m3u8' in link['href']:
-                            stream_url = urllib.parse.urljoin(url, link['href'])
-                            break
-                
-                # Fallback: Look for any MP4 links
-                if not stream_url:
-                    links = soup.find_all('a', href=True)
-                    for link in links:
-                        if '.mp4' in link['href']:
-                            stream_url = urllib.parse.urljoin(url, link['href'])
-                            break
-                            
+            # --- Find Title ---
+            og_title = soup.find('meta', property='og:title')
+            if og_title and og_title.get('content'):
+                meta['title'] = og_title['content']
+            else:
+                title_tag = soup.find('title')
+                if title_tag:
+                    meta['title'] = title_tag.text.strip()
+
+            # --- Find Video Stream ---
+            # Look for <video> tag src
+            video_tag = soup.find('video')
+            if video_tag and video_tag.get('src'):
+                stream_url = urllib.parse.urljoin(url, video_tag['src'])
+            
+            # Look for HLS (.m3u8) links if no video tag found
+            if not stream_url:
+                links = soup.find_all('a', href=True)
+                for link in links:
+                    if '.m3u8' in link['href']:
+                        stream_url = urllib.parse.urljoin(url, link['href'])
+                        break
+            
+            # Fallback: Look for any MP4 links
+            if not stream_url:
+                links = soup.find_all('a', href=True)
+                for link in links:
+                    if '.mp4' in link['href']:
+                        stream_url = urllib.parse.urljoin(url, link['href'])
+                        break
+                        
         except Exception as e:
             logging.error(f"Generic scraping failed for {url}: {e}")
 
         return meta, stream_url
 
-    def _read_and_clean_vtt(self, yt_id):
+    def _read_vtt_cues(self, yt_id):
         try:
             vtt_path = os.path.join(SUBTITLE_DIR, f"{yt_id}.en.vtt")
-            if not os.path.exists(vtt_path): return ""
-            with open(vtt_path, 'r', encoding='utf-8') as f: content = f.read()
-            lines = content.splitlines()
-            clean_lines = []
-            for line in lines:
-                if line.strip().startswith('WEBVTT') or '-->' in line or line.strip().startswith('Kind:') or line.strip().startswith('Language:'): continue
-                line = re.sub(r'<[^>]+>', '', line)
-                clean_lines.append(line.strip())
-            return " ".join(clean_lines)
-        except: return ""
+            if not os.path.exists(vtt_path): return []
+            with open(vtt_path, 'r', encoding='utf-8') as f: return parse_vtt(f.read())
+        except Exception as e:
+            logging.warning(f"Failed to parse subtitles for {yt_id}: {e}")
+            return []
 
     def _download_pixeldrain_thumbnail(self, video_id, pd_id):
         thumb_url = f"https://pixeldrain.com/api/file/{pd_id}/thumbnail"
         target_path = os.path.join(THUMB_DIR, f"thumb_{video_id}.jpg")
         try:
-            resp = requests.get(thumb_url, timeout=5)
+            resp = http_clients.get(thumb_url, timeout=5)
             if resp.status_code == 200:
                 with open(target_path, 'wb') as f: f.write(resp.content)
                 preview_base = os.path.join(PREVIEW_DIR, f"{video_id}_")
@@ -577,33 +748,42 @@ class VIPVideoProcessor:
             return title.replace('_', ' ').replace('-', ' ').title()
         except: return None
 
-    def _fetch_metadata(self, url, yt_id, quality_mode='mp4'):
+    def _fetch_metadata(self, url, quality_mode='mp4'):
         meta = {}
         stream_url = None
+        yt_id = None
         try:
-            subtitle_path_template = os.path.join(SUBTITLE_DIR, f'{yt_id}.%(ext)s') if yt_id else os.path.join(SUBTITLE_DIR, 'subtitle.%(ext)s')
-            fmt = 'bestvideo+bestaudio/best'
-            opts = {
-                'quiet': True, 'skip_download': True, 'ignoreerrors': True, 'socket_timeout': 15,
-                'ffmpeg_location': FFMPEG_CMD,
-                'format': fmt,
-                'writesubtitles': True, 'writeautomaticsub': True,
-                'subtitleslangs': ['en'],
-                'outtmpl': subtitle_path_template,
-                'http_headers': {'User-Agent': 'Mozilla/5.0'}
-            }
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info:
-                    stream_url = info.get('url') 
-                    meta.update({
-                        'title': info.get('title'), 'description': info.get('description'),
-                        'duration': info.get('duration'), 'width': info.get('width'),
-                        'height': info.get('height'), 'tags': ",".join(info.get('tags', []))
-                    })
+            info = info_cache.extract(url)
+            if info:
+                yt_id = info.get('id')
+                stream_url = info_stream_url(info)
+                meta.update({
+                    'title': info.get('title'), 'description': info.get('description'),
+                    'duration': info.get('duration'), 'width': info.get('width'),
+                    'height': info.get('height'), 'tags': ",".join(info.get('tags') or []),
+                    'requested_subtitles': info.get('requested_subtitles'),
+                })
         except Exception as e:
             logging.warning(f"Failed to fetch metadata with yt-dlp for {url}: {e}")
-        return meta, stream_url
+        return meta, stream_url, yt_id
+
+    def _save_subtitles(self, requested_subtitles, yt_id):
+        """Download the English VTT track listed in the info dict (no second extraction)."""
+        sub = (requested_subtitles or {}).get('en')
+        vtt_path = os.path.join(SUBTITLE_DIR, f"{yt_id}.en.vtt")
+        if not sub or os.path.exists(vtt_path): return
+        try:
+            if sub.get('data'):
+                content = sub['data']
+            elif sub.get('url') and sub.get('ext') == 'vtt':
+                resp = http_clients.get(sub['url'], timeout=15)
+                resp.raise_for_status()
+                content = resp.text
+            else:
+                return
+            with open(vtt_path, 'w', encoding='utf-8') as f: f.write(content)
+        except Exception as e:
+            logging.warning(f"Failed to download subtitles for {yt_id}: {e}")
 
     def _ffprobe_fallback(self, url, meta):
         try:
@@ -639,46 +819,77 @@ class VIPVideoProcessor:
         except Exception as e: logging.error(f"ffprobe failed: {e}")
         return meta
     
-    def _generate_visuals(self, url, vid_id, duration, skip_gif=False):
+    def _generate_visuals(self, url, vid_id, duration, skip_clip=False):
+        """
+        One ffmpeg run per video: the input is opened and seeked once, a short window
+        is decoded and split into the thumbnail, preview frames and hover clip.
+        (Scrub-bar sprites and the spread preview frames come from the whole-video
+        keyframe pass in app/storyboard.py.)
+        """
         if not os.path.exists(FFMPEG_CMD): return
         thumb_out = os.path.join(THUMB_DIR, f"thumb_{vid_id}.jpg")
+        clip_out = os.path.join(THUMB_DIR, preview_clip_name(vid_id))
+        preview_out = os.path.join(PREVIEW_DIR, f"{vid_id}_%d.jpg")
         
-        # Convert local file paths to absolute paths for ffmpeg
-        input_url = url
-        is_local = url.startswith('/static/') or (not url.startswith('http://') and not url.startswith('https://'))
-        
-        if is_local:
-            # Local file - convert to absolute path
-            if url.startswith('/static/'):
-                input_url = os.path.abspath(os.path.join(os.getcwd(), url.lstrip('/')))
+        input_url, common_args = ffmpeg_input(url)
+        offset, hls_dir = None, None
+        if is_hls(input_url):
+            # Remote HLS: fetch only the segments around the seek point and decode them locally
+            hls_dir = tempfile.mkdtemp(prefix="vip_hls_")
+            local_path = os.path.join(hls_dir, "window")
+            start, window = self._visuals_window(duration)
+            fetched = fetch_window(input_url, start, window, local_path)
+            if fetched:
+                offset = fetched[0]
+                input_url, common_args = ffmpeg_input(local_path)
             else:
-                input_url = os.path.abspath(url) if not os.path.isabs(url) else url
-            # Use local file args (no network args needed)
-            common_args = [FFMPEG_CMD, '-y', '-hide_banner', '-loglevel', 'error']
-        else:
-            # Remote URL - use network args
-            common_args = [FFMPEG_CMD, '-y', '-hide_banner', '-loglevel', 'error'] + FFMPEG_NETWORK_ARGS
+                logging.info(f"HLS window fetch not possible for {vid_id}, ffmpeg reads the playlist directly")
+        cmd = common_args + self._visuals_args(input_url, duration, thumb_out, preview_out, clip_out, skip_clip, offset=offset)
+        try:
+            subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        except subprocess.CalledProcessError as e:
+            logging.warning(f"ffmpeg visuals failed for {vid_id}: {(e.stderr or '').strip()[:300]}")
+        except subprocess.TimeoutExpired:
+            logging.warning(f"ffmpeg visuals timed out for {vid_id}")
+        finally:
+            if hls_dir: shutil.rmtree(hls_dir, ignore_errors=True)
 
-        # Generate thumbnail (always)
+    def _visuals_window(self, duration):
+        """(seek position, decoded seconds) used for the visuals of a video of this length"""
+        duration = duration or 0
         if duration > 10:
-            try:
-                cmd = common_args + ['-ss', str(duration * 0.1), '-i', input_url, '-vf', "scale=640:-1", '-vframes', '1', '-q:v', '5', thumb_out]
-                subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
-            except: pass
-        elif duration >= 0: 
-             try:
-                cmd = common_args + ['-i', input_url, '-vf', "thumbnail,scale=640:-1", '-frames:v', '1', thumb_out]
-                subprocess.run(cmd, capture_output=True, check=True, timeout=40)
-             except: pass
-
-        # Generate GIF preview (skip if skip_gif=True)
-        if not skip_gif:
-            gif_out = os.path.join(THUMB_DIR, f"thumb_{vid_id}.gif")
-            if duration > 5:
-                try:
-                    gif_cmd = common_args + ['-ss', str((duration * 0.2) - 1), '-t', '2', '-i', input_url, '-filter_complex', '[0:v] scale=320:-1,split [a][b];[a] palettegen [p];[b][p] paletteuse', '-loop', '0', gif_out]
-                    subprocess.run(gif_cmd, capture_output=True, text=True, check=True, timeout=45)
-                except: pass
+            return duration * 0.1, min(VISUALS_WINDOW, max(duration * 0.9 - 1, 2))
+        return 0, (duration if duration > 0 else 10)
+
+    def _visuals_args(self, input_url, duration, thumb_out, preview_out, clip_out, skip_clip=False, offset=None):
+        """
+        Build the input + filter graph arguments for _generate_visuals.
+        offset overrides the seek position (used when the input is a pre-cut local segment).
+        """
+        duration = duration or 0
+        start, window = self._visuals_window(duration)
+        if offset is not None:
+            start = offset
+        # Short or unknown length: no seek, let ffmpeg pick a representative frame
+        thumb_filter = "trim=end_frame=1" if duration > 10 else "thumbnail=n=50"
+        with_clip = not skip_clip and duration > 5
+
+        branches = ["thumb", "prev"] + (["clip"] if with_clip else [])
+        graph = [
+            f"[0:v]split={len(branches)}" + "".join(f"[{b}_in]" for b in branches),
+            f"[thumb_in]{thumb_filter},scale=640:-2[thumb]",
+            f"[prev_in]fps={PREVIEW_FRAMES}/{window:.3f},scale=640:-2[prev]",
+        ]
+        if with_clip:
+            graph.append(preview_clip_graph(PREVIEW_FORMAT))
+
+        args = (['-ss', f"{start:.3f}"] if start > 0 else []) + ['-t', f"{window:.3f}", '-i', input_url, '-an',
+                '-filter_complex', ";".join(graph),
+                '-map', '[thumb]', '-frames:v', '1', '-q:v', '5', thumb_out,
+                '-map', '[prev]', '-frames:v', str(PREVIEW_FRAMES), '-start_number', '0', '-q:v', '5', preview_out]
+        if with_clip:
+            args += ['-map', '[clip]'] + preview_clip_codec_args(PREVIEW_FORMAT) + [clip_out]
+        return args
 
     def _generate_smart_tags(self, title):
         if not title: return ""
@@ -695,45 +906,101 @@ class VIPVideoProcessor:
             return ",".join(list(tags)[:10])
         except: return ""
 
-def search_videos_by_subtitle(query: str, db: Session):
-    return db.query(Video).filter(Video.subtitle.contains(query)).all()
+def convert_gif_previews(video_ids: Optional[List[int]] = None, fmt: str = None) -> dict:
+    """
+    Re-encode existing GIF hover previews into the configured format.
+    A conversion is only kept when it is smaller than the GIF. Returns byte totals.
+    """
+    fmt = fmt or PREVIEW_FORMAT
+    report = {"format": fmt, "converted": 0, "kept_gif": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    if fmt == "gif" or not os.path.exists(FFMPEG_CMD):
+        return {**report, "bytes_saved": 0}
+
+    db = SessionLocal()
+    try:
+        query = db.query(Video.id).filter(Video.gif_preview_path.like("%.gif"))
+        if video_ids: query = query.filter(Video.id.in_(video_ids))
+        ids = [r[0] for r in query.all()]
+    finally:
+        db.close()
+
+    for vid_id in ids:
+        gif_path = os.path.join(THUMB_DIR, preview_clip_name(vid_id, "gif"))
+        out_path = os.path.join(THUMB_DIR, preview_clip_name(vid_id, fmt))
+        if not os.path.exists(gif_path):
+            continue
+        cmd = [FFMPEG_CMD, '-y', '-hide_banner', '-loglevel', 'error', '-i', gif_path,
+               '-filter_complex', preview_clip_graph(fmt, src="0:v"), '-map', '[clip]'] + preview_clip_codec_args(fmt) + [out_path]
+        try:
+            subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"Preview conversion failed for {vid_id}: {e}")
+            report["failed"] += 1
+            continue
+
+        before, after = os.path.getsize(gif_path), os.path.getsize(out_path)
+        if after >= before:
+            os.remove(out_path)
+            report["kept_gif"] += 1
+            continue
+
+        db = SessionLocal()
+        try:
+            video = db.query(Video).get(vid_id)
+            if video:
+                video.gif_preview_path = f"/static/thumbnails/{preview_clip_name(vid_id, fmt)}"
+                db.commit()
+        finally:
+            db.close()
+        os.remove(gif_path)
+        report["converted"] += 1
+        report["bytes_before"] += before
+        report["bytes_after"] += after
+
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    logging.info(f"Preview conversion to {fmt}: {report}")
+    return report
+
+def search_videos_by_subtitle(query: str, db: Session, limit: int = 30):
+    return search_cues(db, query, limit=limit)
+
+QUALITY_TIERS = ["4K", "FHD", "HD", "SD", "Unknown"]
+DURATION_BUCKETS = ["<1 min", "1-5 min", "5-20 min", "20-60 min", "60+ min", "Unknown"]
+
+def _counter_stats(db: Session, dimension: str, order=None):
+    # stats_counters is maintained by triggers on videos - reading it never touches the videos table
+    rows = db.query(StatsCounter.key, StatsCounter.value) \
+        .filter(StatsCounter.dimension == dimension, StatsCounter.value > 0).all()
+    if order:
+        counts = dict(rows)
+        return [{"label": k, "value": counts.get(k, 0)} for k in order]
+    return [{"label": k, "value": v} for k, v in sorted(rows, key=lambda r: -r[1])]
 
 def get_batch_stats(db: Session):
-    results = db.query(Video.batch_name, func.count(Video.id)).group_by(Video.batch_name).all()
-    return [{"label": r[0] or "Uncategorized", "value": r[1]} for r in results]
+    return [{"label": r["label"] or "Uncategorized", "value": r["value"]} for r in _counter_stats(db, "batch")]
 
 def get_tags_stats(db: Session):
-    all_tags = []
-    videos = db.query(Video.tags, Video.ai_tags).all()
-    for v_tags, v_ai_tags in videos:
-        if v_tags: all_tags.extend(t.strip() for t in v_tags.split(','))
-        if v_ai_tags: all_tags.extend(t.strip() for t in v_ai_tags.split(','))
-    tag_counts = Counter(all_tags)
-    return [{"label": t[0], "value": t[1]} for t in tag_counts.most_common(20)]
+    return [{"label": t["name"], "value": t["count"]} for t in list_tags(db, limit=20, by_count=True)]
 
 def get_quality_stats(db: Session):
-    stats = { "4K": 0, "FHD": 0, "HD": 0, "SD": 0, "Unknown": 0 }
-    videos = db.query(Video.height).all()
-    for v in videos:
-        h = v[0]
-        if h >= 1080: stats["FHD"] += 1
-        elif h >= 720: stats["HD"] += 1
-        elif h > 0: stats["SD"] += 1
-        else: stats["Unknown"] += 1
-    return [{"label": k, "value": v} for k, v in stats.items()]
-
-def extract_playlist_urls(url: str, parser: str = "yt-dlp"):
-    opts = {'extract_flat': True, 'quiet': True, 'ignoreerrors': True}
-    found_urls = []
-    try:
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if info and 'entries' in info:
-                for entry in info['entries']:
-                    if entry: found_urls.append(entry.get('url') or entry.get('webpage_url'))
-            elif info: found_urls.append(url)
-    except: pass
-    return [u for u in found_urls if u] if found_urls else [url]
+    return _counter_stats(db, "quality", QUALITY_TIERS)
+
+def get_status_stats(db: Session):
+    return _counter_stats(db, "status")
+
+def get_duration_stats(db: Session):
+    return _counter_stats(db, "duration", DURATION_BUCKETS)
+
+def get_stats_summary(db: Session):
+    """All counters in one read: {"total", "batch": {...}, "quality": {...}, "status": {...}, "duration": {...}}"""
+    summary = {"total": 0}
+    for dimension, key, value in db.query(StatsCounter.dimension, StatsCounter.key, StatsCounter.value) \
+            .filter(StatsCounter.value > 0):
+        if dimension == "total":
+            summary["total"] = value
+        else:
+            summary.setdefault(dimension, {})[key] = value
+    return summary
 
 # --- Coomer/Kemono Profile Scanner (VIP Dashboard) ---
 def scan_coomer_profile(profile_url: str):
@@ -775,7 +1042,7 @@ def scan_coomer_profile(profile_url: str):
         }
         
         # Fetch profile page
-        resp = requests.get(profile_url, headers=headers, timeout=30)
+        resp = http_clients.get(profile_url, headers=headers, timeout=30)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, 'html.parser')
         
@@ -826,7 +1093,7 @@ def scan_coomer_profile(profile_url: str):
         # Scan posts for files
         for post_url in post_links[:100]:
             try:
-                post_resp = requests.get(post_url, headers=headers, timeout=15)
+                post_resp = http_clients.get(post_url, headers=headers, timeout=15)
                 post_resp.raise_for_status()
                 post_soup = BeautifulSoup(post_resp.text, 'html.parser')
                 
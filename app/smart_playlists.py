@@ -0,0 +1,113 @@
+"""
+Smart playlist evaluation.
+Rules are compiled to SQL conditions once per rule set, and the ids of the matching
+videos are cached per playlist until the `videos` data version changes (triggers bump
+it when a video is added or deleted or one of its rule columns changes). Pages and
+counts of a cached playlist are then slices of an id list, not a query over the library.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+from .database import DataVersion, SmartPlaylist, Video
+from .queries import compile_rules, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+def data_version(db: Session, name: str = "videos") -> int:
+    return db.query(DataVersion.value).filter(DataVersion.name == name).scalar() or 0
+
+class SmartPlaylistCache:
+    """LRU of playlist id -> (rules key, compiled conditions, skipped rules, data version, matching ids ascending)"""
+
+    def __init__(self, size: int = None):
+        self.size = size or int(os.environ.get("VIP_SMART_PLAYLIST_CACHE", 32))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "compiled": 0}
+
+    def ids(self, db: Session, playlist: SmartPlaylist) -> array:
+        """
+        Ids of the playlist's videos in ascending order. Invalid stored rules (saved
+        before rules were validated) are skipped with a warning, see skipped().
+        """
+        key = json.dumps(playlist.rules, sort_keys=True)
+        # Read before the ids: a change in between only makes the next call recompute
+        version = data_version(db)
+        with self._lock:
+            entry = self._entries.get(playlist.id)
+            if entry and entry[0] == key:
+                self._entries.move_to_end(playlist.id)
+                if entry[3] == version:
+                    self._stats["hits"] += 1
+                    return entry[4]
+            self._stats["misses"] += 1
+        if entry and entry[0] == key:
+            conditions, skipped = entry[1], entry[2]
+        else:
+            skipped = []
+            conditions = compile_rules(playlist.rules, skipped)
+            self._count("compiled")
+            if skipped:
+                logger.warning(f"Smart playlist {playlist.id}: skipping invalid rules: {'; '.join(skipped)}")
+        ids = array("q", (vid for vid, in db.query(Video.id).filter(*conditions).order_by(Video.id)))
+        with self._lock:
+            self._entries[playlist.id] = (key, conditions, skipped, version, ids)
+            self._entries.move_to_end(playlist.id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return ids
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def skipped(self, playlist_id: int) -> List[str]:
+        """Errors of the rules left out when the playlist was last compiled"""
+        with self._lock:
+            entry = self._entries.get(playlist_id)
+            return list(entry[2]) if entry else []
+
+    def invalidate(self, playlist_id: int):
+        with self._lock:
+            self._entries.pop(playlist_id, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "size": self.size, "cached": len(self._entries),
+                    "cached_ids": sum(len(e[4]) for e in self._entries.values())}
+
+# Global instance
+smart_playlist_cache = SmartPlaylistCache()
+
+def playlist_count(db: Session, playlist: SmartPlaylist) -> int:
+    return len(smart_playlist_cache.ids(db, playlist))
+
+def playlist_page(db: Session, playlist: SmartPlaylist, query: Query, cursor: Optional[str] = None,
+                  limit: int = 100) -> Tuple[List[Video], Optional[str], int]:
+    """
+    One page of the playlist's videos (newest first), the cursor of the next page
+    (None on the last one) and the playlist's total. `query` selects the columns.
+    """
+    ids = smart_playlist_cache.ids(db, playlist)
+    end = len(ids)
+    if cursor:
+        data = decode_cursor(cursor)
+        values = data.get("k")
+        if data.get("s") != "date_desc" or not isinstance(values, list) or len(values) != 1 \
+                or not isinstance(values[0], int):
+            raise ValueError("Invalid cursor")
+        # Keyset: the ids below the last one shown, also when videos were added or removed since
+        end = bisect.bisect_left(ids, values[0])
+    page = ids[max(end - limit, 0):end].tolist()[::-1]
+    rows = {v.id: v for v in query.filter(Video.id.in_(page))} if page else {}
+    videos = [rows[i] for i in page if i in rows]
+    next_cursor = encode_cursor({"s": "date_desc", "k": [page[-1]]}) if end > limit else None
+    return videos, next_cursor, len(ids)
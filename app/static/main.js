@@ -1,11 +1,14 @@
 console.log("VIP Engine V2 Loaded");
 
+// Status socket lives outside Alpine state (a reactive proxy breaks WebSocket.send)
+let statusSocket = null;
+
 // 1. Definujeme logiku globálne
 function vipDashboard() {
     return {
         videos: [], batches: [], tags: [],
-        filters: { search: '', batch: 'All', favoritesOnly: false, quality: 'All', durationMin: 0, durationMax: 3600, sort: 'date_desc', dateMin: null, dateMax: null },
-        page: 1, hasMore: true, isLoading: false,
+        filters: { search: '', tag: '', batch: 'All', favoritesOnly: false, quality: 'All', durationMin: 0, durationMax: 3600, sort: 'date_desc', dateMin: null, dateMax: null },
+        cursor: null, hasMore: true, isLoading: false,
         importProgress: { active: false, percent: 0, total: 0, done: 0, eta: 0, startTime: null },
         
         // Player State
@@ -16,6 +19,7 @@ function vipDashboard() {
         activePlayerIdx: 0,
         hls1: null,
         hls2: null,
+        storyboard: { cues: [], visible: false, style: '', label: '' },
         
         // Settings & Filters
         showSettings: false,
@@ -35,6 +39,13 @@ function vipDashboard() {
             name: '',
             rules: []
         },
+        // Operators per rule field, same as PLAYLIST_RULE_FIELDS / RULE_OPERATORS on the server
+        ruleFieldKinds: { title: 'text', batch_name: 'text', status: 'text', tags: 'tag', ai_tags: 'tag',
+                          duration: 'number', width: 'number', height: 'number', is_favorite: 'bool', is_watched: 'bool' },
+        ruleKindOperators: { text: ['contains', 'not_contains', 'equals', 'not_equals'], tag: ['contains', 'not_contains', 'equals', 'not_equals'],
+                             number: ['equals', 'not_equals', 'greater_than', 'less_than'], bool: ['equals', 'not_equals'] },
+        ruleOperatorLabels: { contains: 'Contains', not_contains: 'Not Contains', equals: 'Equals', not_equals: 'Not Equals',
+                              greater_than: 'Greater Than', less_than: 'Less Than' },
         
         // Command Palette
         showCommandPalette: false,
@@ -220,15 +231,26 @@ function vipDashboard() {
             }
         },
 
-        async loadSmartPlaylist(playlistId) {
+        async loadSmartPlaylist(playlistId, reset = true) {
+            if (reset) { this.videos = []; this.cursor = null; this.hasMore = true; }
+            else if (this.isLoading || !this.hasMore) return;
             this.activeSmartPlaylistId = playlistId;
             this.isLoading = true;
+            const params = new URLSearchParams({ limit: 50 });
+            if (this.cursor) params.set('cursor', this.cursor);
             try {
-                const res = await fetch(`/api/smart-playlists/${playlistId}/videos`);
-                this.videos = await res.json();
-                this.hasMore = false; // Smart playlists load all at once
+                const res = await fetch(`/api/smart-playlists/${playlistId}/videos?${params}`);
+                if (!res.ok) throw new Error((await res.json()).detail);
+                const data = await res.json();
+                // Paged like the library: keyset cursor of the next page, missing on the last one
+                this.cursor = res.headers.get('X-Next-Cursor');
+                this.hasMore = !!this.cursor;
+                const skipped = res.headers.get('X-Skipped-Rules');
+                if (reset && skipped) this.showToast(`${skipped} invalid rule(s) ignored - edit the playlist to fix them`, 'warning', 'warning');
+                this.videos = reset ? data : [...this.videos, ...data];
+                this.syncStatusSubscription();
             } catch (e) {
-                this.showToast('Failed to load playlist videos', 'error', 'error');
+                this.showToast(e.message || 'Failed to load playlist videos', 'error', 'error');
             } finally {
                 this.isLoading = false;
             }
@@ -239,6 +261,8 @@ function vipDashboard() {
                 this.editingPlaylistId = playlist.id;
                 this.smartPlaylistForm.name = playlist.name;
                 this.smartPlaylistForm.rules = JSON.parse(JSON.stringify(playlist.rules));
+                // Rules saved before operators were checked per field get the field's first operator
+                this.smartPlaylistForm.rules.forEach(rule => this.fixRuleOperator(rule));
             } else {
                 this.editingPlaylistId = null;
                 this.smartPlaylistForm.name = '';
@@ -251,6 +275,15 @@ function vipDashboard() {
             this.smartPlaylistForm.rules.push({ field: 'title', operator: 'contains', value: '' });
         },
 
+        ruleOperators(field) {
+            return this.ruleKindOperators[this.ruleFieldKinds[field] || 'text'];
+        },
+
+        fixRuleOperator(rule) {
+            const ops = this.ruleOperators(rule.field);
+            if (!ops.includes(rule.operator)) rule.operator = ops[0];
+        },
+
         removeSmartPlaylistRule(index) {
             this.smartPlaylistForm.rules.splice(index, 1);
         },
@@ -270,7 +303,8 @@ function vipDashboard() {
                     this.showSmartPlaylistModal = false;
                     this.loadSmartPlaylists();
                 } else {
-                    this.showToast('Failed to save playlist', 'error', 'error');
+                    const detail = (await res.json().catch(() => ({}))).detail;
+                    this.showToast(typeof detail === 'string' ? detail : 'Failed to save playlist', 'error', 'error');
                 }
             } catch (e) {
                 this.showToast('An error occurred', 'error', 'error');
@@ -287,7 +321,8 @@ function vipDashboard() {
         },
         
         setTagFilter(tag) {
-            this.filters.search = tag;
+            // Exact tag match; clicking the active tag clears it
+            this.filters.tag = this.filters.tag === tag ? '' : tag;
             this.loadVideos(true);
         },
 
@@ -306,8 +341,9 @@ function vipDashboard() {
                 return;
             }
             
-            this.searchVideos(q).then(videos => {
-                const videoResults = videos.map(v => ({...v, type: 'video'}));
+            this.searchVideos(q).then(hits => {
+                // One result per subtitle cue hit; snippet already carries <mark> highlights
+                const videoResults = hits.map(h => ({...h, id: `${h.video_id}:${h.start}`, type: 'video'}));
                 const filteredCommands = this.commands.filter(c => c.title.toLowerCase().includes(q.toLowerCase()));
                 this.commandResults = [...filteredCommands, ...videoResults];
                 this.isCommandSearching = false;
@@ -319,12 +355,21 @@ function vipDashboard() {
             if (result.type === 'command') {
                 result.action.call(this); 
             } else {
-                this.playVideo(result);
+                this.playSubtitleHit(result);
             }
             this.showCommandPalette = false;
             this.commandQuery = '';
         },
 
+        async playSubtitleHit(hit) {
+            let video = this.videos.find(v => v.id === hit.video_id);
+            if (!video) {
+                try { video = await (await fetch(`/api/videos/${hit.video_id}`)).json(); }
+                catch (e) { return this.showToast('Video not found', 'error', 'error'); }
+            }
+            this.playVideo({ ...video, seek_to: hit.start });
+        },
+
         setupKeys() {
             window.addEventListener('keydown', (e) => {
                 if(e.target.tagName === 'INPUT' || e.target.tagName === 'TEXTAREA') return;                
@@ -366,19 +411,6 @@ function vipDashboard() {
             }
         },
 
-        highlight(text, query) {
-            if (!text || !query) return (text || '').substring(0, 200);
-            const index = text.toLowerCase().indexOf(query.toLowerCase());
-            if (index === -1) return text.substring(0, 200) + '...';
-            
-            const start = Math.max(0, index - 50);
-            const end = Math.min(text.length, index + query.length + 50);
-            const snippet = text.substring(start, end);
-            
-            const highlighted = snippet.replace(new RegExp(query, 'gi'), (match) => `<mark>${match}</mark>`);
-            return `...${highlighted}...`;
-        },
-
         loadSettings() {
             const s = localStorage.getItem('vipSettings');
             if(s) {
@@ -528,7 +560,54 @@ function vipDashboard() {
             }
 
             videoRef.playbackRate = parseFloat(this.settings.playbackSpeed);
-            if (video.resume_time > 5) videoRef.currentTime = video.resume_time;
+            // Subtitle search hits jump to the cue, otherwise resume where playback stopped
+            if (video.seek_to !== undefined) videoRef.currentTime = video.seek_to;
+            else if (video.resume_time > 5) videoRef.currentTime = video.resume_time;
+            if (playerIdx === 0) this.loadStoryboard(video);
+        },
+
+        // --- Scrub-bar storyboard (WebVTT thumbnails track) ---
+        async loadStoryboard(video) {
+            this.storyboard = { cues: [], visible: false, style: '', label: '' };
+            if (!video.sprite_path) return;
+            try {
+                const res = await fetch(`/api/videos/${video.id}/storyboard.vtt`);
+                if (res.ok) this.storyboard.cues = this.parseStoryboardVtt(await res.text());
+            } catch (e) {
+                console.warn('Storyboard not available', e);
+            }
+        },
+
+        parseStoryboardVtt(text) {
+            const toSeconds = (t) => t.trim().split(':').reduce((acc, part) => acc * 60 + parseFloat(part), 0);
+            const cues = [];
+            text.split(/\r?\n\r?\n/).forEach(block => {
+                const lines = block.trim().split(/\r?\n/);
+                const timing = lines.find(l => l.includes('-->'));
+                const ref = lines[lines.length - 1];
+                if (!timing || !ref.includes('#xywh=')) return;
+                const [start, end] = timing.split('-->').map(toSeconds);
+                const [url, frag] = ref.split('#xywh=');
+                const [x, y, w, h] = frag.split(',').map(Number);
+                cues.push({ start, end, url, x, y, w, h });
+            });
+            return cues;
+        },
+
+        onSeekHover(e) {
+            const vid = this.$refs.videoPlayer1;
+            const cues = this.storyboard.cues;
+            if (!vid || !vid.duration || !cues.length) return;
+            const rect = vid.getBoundingClientRect();
+            // Native controls: only react near the progress bar
+            if (e.clientY < rect.bottom - 60) { this.storyboard.visible = false; return; }
+            const ratio = Math.min(Math.max((e.clientX - rect.left) / rect.width, 0), 1);
+            const t = ratio * vid.duration;
+            const cue = cues.find(c => t >= c.start && t < c.end) || cues[cues.length - 1];
+            const left = Math.min(Math.max(e.clientX - rect.left, cue.w / 2), rect.width - cue.w / 2);
+            this.storyboard.label = this.formatDuration(t);
+            this.storyboard.style = `left:${left}px;width:${cue.w}px;height:${cue.h}px;background:url('${cue.url}') -${cue.x}px -${cue.y}px;`;
+            this.storyboard.visible = true;
         },
 
         playVideo(video) {
@@ -862,42 +941,41 @@ function vipDashboard() {
         },
         
         async loadVideos(reset = false) {
-            if (reset) { this.videos = []; this.page = 1; this.hasMore = true; }
+            // "Load more" of an open smart playlist continues the playlist
+            if (!reset && this.activeSmartPlaylistId) return this.loadSmartPlaylist(this.activeSmartPlaylistId, false);
+            if (reset) { this.videos = []; this.cursor = null; this.hasMore = true; this.activeSmartPlaylistId = null; }
             if (this.isLoading && !reset) return;
+            if (!reset && !this.hasMore) return;
             this.isLoading = true;
 
-            const params = new URLSearchParams({ ...this.filters, page: this.page, limit: 10 });
+            const params = new URLSearchParams({ ...this.filters, limit: 10 });
+            if (this.cursor) params.set('cursor', this.cursor);
             try {
                 const res = await fetch(`/api/videos?${params}`);
                 const data = await res.json();
-                if (data.length === 0) this.hasMore = false;
-                else {
+                // Keyset cursor of the next page; missing on the last page
+                this.cursor = res.headers.get('X-Next-Cursor');
+                this.hasMore = !!this.cursor;
+                if (data.length) {
                     const newItems = data.filter(n => !this.videos.some(e => e.id === n.id));
                     this.videos = reset ? data : [...this.videos, ...newItems];
-                    this.page++;
+                    this.syncStatusSubscription();
                 }
             } catch(e) {} finally { this.isLoading = false; }
         },
+        syncStatusSubscription() {
+            // Only updates for the shown batch / loaded cards are sent to this tab
+            if (!statusSocket || statusSocket.readyState !== WebSocket.OPEN) return;
+            const batches = this.filters.batch && this.filters.batch !== 'All' ? [this.filters.batch] : [];
+            statusSocket.send(JSON.stringify({ action: 'subscribe', batches, video_ids: this.videos.map(v => v.id), imports: true }));
+        },
         connectWebSocket() {
             const wsUrl = `ws://${window.location.host}/ws/status`;
             const socket = new WebSocket(wsUrl);
+            statusSocket = socket;
+            socket.onopen = () => this.syncStatusSubscription();
 
-            socket.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                if (data.type === 'status_update') {
-                    const video = this.videos.find(v => v.id === data.video_id);
-                    if (video) {
-                        video.status = data.status;
-                        if (data.status === 'ready') {
-                            if (data.title) video.title = data.title;
-                            if (data.thumbnail_path) video.thumbnail_path = data.thumbnail_path;
-                            this.showToast(`Ready: ${video.title}`, 'check_circle', 'success');
-                        } else if (data.status === 'error') {
-                            this.showToast(`Error: ${video.title}`, 'error', 'error');
-                        }
-                    }
-                }
-            };
+            socket.onmessage = (event) => this.handleSocketMessage(JSON.parse(event.data), true);
 
             socket.onclose = () => {
                 console.log('WebSocket disconnected. Reconnecting...');
@@ -909,6 +987,53 @@ function vipDashboard() {
                 socket.close();
             };
         },
+        handleSocketMessage(data, notify) {
+            if (data.type === 'status_update') {
+                return this.applyStatusUpdate(data, notify);
+            } else if (data.type === 'status_batch') {
+                // Server coalesces bursts of any message type; each item goes to its own handler,
+                // status updates get one toast summary instead of a toast per video
+                const updates = data.updates.filter(u => u.type === 'status_update');
+                const notifyEach = updates.length <= 3;
+                const known = [];
+                data.updates.forEach(u => {
+                    if (this.handleSocketMessage(u, notifyEach) && u.type === 'status_update') known.push(u);
+                });
+                if (!notifyEach) {
+                    const ready = known.filter(u => u.status === 'ready').length;
+                    const failed = known.filter(u => u.status === 'error').length;
+                    if (ready) this.showToast(`Ready: ${ready} videos`, 'check_circle', 'success');
+                    if (failed) this.showToast(`Error: ${failed} videos`, 'error', 'error');
+                }
+            } else if (data.type === 'import_progress') {
+                this.applyImportProgress(data);
+            }
+            return false;
+        },
+        applyImportProgress(data) {
+            // Streaming file import (CSV/JSON/TXT) reports per chunk; percent follows the bytes parsed
+            this.importProgress.active = !data.done;
+            this.importProgress.total = data.rows;
+            this.importProgress.done = data.inserted;
+            this.importProgress.percent = data.total_bytes ? Math.round(data.bytes / data.total_bytes * 100) : 0;
+            if (!data.done) return;
+            if (data.error) this.showToast(`Import ${data.batch_name} failed: ${data.error}`, 'error', 'error');
+            else this.showToast(`Imported ${data.inserted} videos (${data.skipped} already in library)`, 'check_circle', 'success');
+            this.loadBatches(); this.loadVideos(true);
+        },
+        applyStatusUpdate(data, notify) {
+            const video = this.videos.find(v => v.id === data.video_id);
+            if (!video) return false;
+            video.status = data.status;
+            if (data.status === 'ready') {
+                if (data.title) video.title = data.title;
+                if (data.thumbnail_path) video.thumbnail_path = data.thumbnail_path;
+                if (notify) this.showToast(`Ready: ${video.title}`, 'check_circle', 'success');
+            } else if (data.status === 'error') {
+                if (notify) this.showToast(`Error: ${video.title}`, 'error', 'error');
+            }
+            return true;
+        },
         async deleteCurrentBatch() {
             if(this.filters.batch === 'All' || !confirm("Delete ALL videos in batch?")) return;
             await fetch('/api/batch/delete-all', { method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({ batch_name: this.filters.batch }) });
@@ -1111,6 +1236,7 @@ function vipDashboard() {
         onTimeUpdate(e, v) { if(v && Math.random()>0.95) fetch(`/api/videos/${v.id}`, {method:'PUT', headers:{'Content-Type':'application/json'}, body:JSON.stringify({resume_time:e.target.currentTime})}); },
         startPreview(v) { if(v.status==='ready' && !this.batchMode) { this.hoverVideoId = v.id; } },
         stopPreview() { this.hoverVideoId = null; },
+        isClipPreview(path) { return !!path && path.endsWith('.mp4'); },
         isSelected(id) { return this.selectedIds.includes(id); },
         // FIX: Generovanie naozaj unikátneho ID pre toast
         showToast(m, i, t='info') { 
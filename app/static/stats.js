@@ -4,6 +4,8 @@ function statsPage() {
             this.loadBatchData();
             this.loadTagsData();
             this.loadQualityData();
+            this.loadDurationData();
+            this.loadStatusData();
         },
 
         async loadBatchData() {
@@ -24,6 +26,18 @@ function statsPage() {
             this.renderChart('qualityChart', 'doughnut', data, 'Videos by Quality');
         },
 
+        async loadDurationData() {
+            const response = await fetch('/api/stats/duration');
+            const data = await response.json();
+            this.renderChart('durationChart', 'bar', data, 'Videos by Duration');
+        },
+
+        async loadStatusData() {
+            const response = await fetch('/api/stats/status');
+            const data = await response.json();
+            this.renderChart('statusChart', 'doughnut', data, 'Videos by Status');
+        },
+
         renderChart(elementId, type, chartData, label) {
             const ctx = document.getElementById(elementId).getContext('2d');
             new Chart(ctx, {
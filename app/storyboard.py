@@ -0,0 +1,132 @@
+"""
+Scrub-bar storyboards: tiled sprite sheets taken at fixed intervals plus a
+WebVTT thumbnails track (`sheet.jpg#xywh=x,y,w,h` cues) for seek previews.
+The same keyframe pass over the whole video also writes the `{id}_N.jpg` preview
+frames, spread over the timeline instead of taken from the visuals window.
+Runs as a deferred, low-priority job after processing and as a bulk backfill.
+"""
+import logging
+import math
+import os
+import shutil
+import subprocess
+from typing import List, Optional
+
+from .database import Video, SessionLocal
+from .info_cache import info_cache, stream_url
+from .services import FFMPEG_CMD, PREVIEW_DIR, PREVIEW_FRAMES, ffmpeg_input
+
+logger = logging.getLogger(__name__)
+
+STORYBOARD_DIR = "app/static/storyboards"
+os.makedirs(STORYBOARD_DIR, exist_ok=True)
+
+TILE_WIDTH, TILE_HEIGHT = 160, 90
+COLS, ROWS = 10, 10
+MAX_FRAMES = 400  # long videos get a wider interval instead of more sheets
+STORYBOARD_INTERVAL = float(os.environ.get("VIP_STORYBOARD_INTERVAL", 10))
+STORYBOARD_FORMAT = os.environ.get("VIP_STORYBOARD_FORMAT", "jpg")  # jpg or webp
+
+def storyboard_interval(duration: float) -> float:
+    return max(STORYBOARD_INTERVAL, math.ceil(duration / MAX_FRAMES))
+
+def vtt_path(video_id: int) -> str:
+    return os.path.join(STORYBOARD_DIR, str(video_id), "storyboard.vtt")
+
+def _vtt_timestamp(seconds: float) -> str:
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+def build_vtt(video_id: int, duration: float, interval: float, sheets: int, ext: str) -> str:
+    per_sheet = COLS * ROWS
+    frames = min(math.ceil(duration / interval), sheets * per_sheet)
+    lines = ["WEBVTT", ""]
+    for i in range(frames):
+        start = i * interval
+        end = min((i + 1) * interval, duration)
+        pos = i % per_sheet
+        x, y = (pos % COLS) * TILE_WIDTH, (pos // COLS) * TILE_HEIGHT
+        sheet = f"/static/storyboards/{video_id}/sheet_{i // per_sheet + 1:03d}.{ext}"
+        lines += [f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}", f"{sheet}#xywh={x},{y},{TILE_WIDTH},{TILE_HEIGHT}", ""]
+    return "\n".join(lines)
+
+def generate_storyboard(video_id: int, url: str, duration: float) -> Optional[str]:
+    """
+    Write sprite sheets + storyboard.vtt and the preview frames for one video.
+    Returns the sprite_path of the first sheet, or None on failure.
+    """
+    if not os.path.exists(FFMPEG_CMD) or not url or not duration or duration <= 0:
+        return None
+
+    ext = "webp" if STORYBOARD_FORMAT == "webp" else "jpg"
+    interval = storyboard_interval(duration)
+    out_dir = os.path.join(STORYBOARD_DIR, str(video_id))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+
+    input_url, common_args = ffmpeg_input(url)
+    step = duration / PREVIEW_FRAMES
+    graph = (f"[0:v]split=2[sb][pv];"
+             f"[sb]fps=1/{interval},"
+             f"scale={TILE_WIDTH}:{TILE_HEIGHT}:force_original_aspect_ratio=decrease,"
+             f"pad={TILE_WIDTH}:{TILE_HEIGHT}:(ow-iw)/2:(oh-ih)/2,"
+             f"tile={COLS}x{ROWS}[sheets];"
+             # Preview frames: the first keyframe after the middle of each of PREVIEW_FRAMES equal slices
+             f"[pv]select='isnan(prev_selected_t)*gte(t,{step / 2:.3f})+gte(t-prev_selected_t,{step:.3f})',"
+             f"scale=640:-2[prev]")
+    # Keyframes only: a storyboard does not need exact frames and this skips most decoding
+    cmd = common_args + ['-skip_frame', 'nokey', '-i', input_url, '-an', '-filter_complex', graph,
+                         '-map', '[sheets]', '-q:v', '5', os.path.join(out_dir, f"sheet_%03d.{ext}"),
+                         '-map', '[prev]', '-vsync', 'vfr', '-frames:v', str(PREVIEW_FRAMES), '-start_number', '0',
+                         '-q:v', '5', os.path.join(PREVIEW_DIR, f"{video_id}_%d.jpg")]
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=max(120, duration / 4))
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"Storyboard ffmpeg failed for {video_id}: {(e.stderr or '').strip()[:300]}")
+        return None
+    except subprocess.TimeoutExpired:
+        logger.warning(f"Storyboard ffmpeg timed out for {video_id}")
+        return None
+
+    sheets = len([f for f in os.listdir(out_dir) if f.startswith("sheet_")])
+    if not sheets:
+        return None
+    with open(vtt_path(video_id), "w", encoding="utf-8") as f:
+        f.write(build_vtt(video_id, duration, interval, sheets, ext))
+    return f"/static/storyboards/{video_id}/sheet_001.{ext}"
+
+def storyboard_input(video: Video) -> Optional[str]:
+    """
+    URL ffmpeg reads for a stored video. video.url of an older import is usually a
+    signed stream URL that has expired, so remote sources are resolved again through
+    the info cache (a fresh extraction at most once per TTL), like processing does.
+    """
+    source = video.source_url
+    if source and source.startswith(('http://', 'https://')) and source != video.url:
+        fresh = stream_url(info_cache.extract(source))
+        if fresh:
+            return fresh
+        logger.info(f"No fresh stream URL for video {video.id}, using the stored one")
+    return video.url
+
+def build_storyboards(video_ids: List[int]) -> dict:
+    """Job body: generate storyboards for the given videos and store sprite_path"""
+    generated = 0
+    for video_id in video_ids:
+        db = SessionLocal()
+        try:
+            video = db.query(Video).get(video_id)
+            if not video or video.status != "ready":
+                continue
+            sprite_path = generate_storyboard(video.id, storyboard_input(video), video.duration)
+            if sprite_path:
+                video.sprite_path = sprite_path
+                video.preview_path = video.preview_path or f"/static/previews/{video.id}"
+                db.commit()
+                generated += 1
+        except Exception as e:
+            logger.error(f"Storyboard generation failed for {video_id}: {e}")
+        finally:
+            db.close()
+    return {"generated": generated, "requested": len(video_ids)}
@@ -0,0 +1,147 @@
+"""
+Subtitle full-text index for Super Search.
+Subtitles are stored as timed cues in `subtitle_cues`; the FTS5 table
+`subtitle_cues_fts` indexes their text (external content, kept in sync by
+triggers). Searches are ranked with bm25 and return (video_id, start, snippet)
+hits, so the player can jump to the exact moment.
+"""
+import html
+import logging
+import re
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import SubtitleCue
+
+logger = logging.getLogger(__name__)
+
+Cue = Tuple[float, float, str]
+
+_TIMING_RE = re.compile(r'((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})')
+_TAG_RE = re.compile(r'<[^>]+>')
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# snippet() markers, replaced by <mark> after the cue text is HTML-escaped
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+MAX_HITS_PER_VIDEO = 3
+# bm25 has to score every matching cue; above this many matches (stop words, short
+# prefixes) the newest matching cues are returned unranked instead
+RANK_CAP = 20000
+MIN_PREFIX = 3  # matches the FTS prefix='3' index
+
+def _seconds(stamp: str) -> float:
+    seconds = 0.0
+    for part in stamp.replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def parse_vtt(content: str) -> List[Cue]:
+    """WebVTT -> [(start, end, text)]; repeated lines of rolling auto-captions are dropped"""
+    cues: List[Cue] = []
+    timing, lines, previous = None, [], set()
+
+    def flush():
+        nonlocal previous
+        if timing and lines:
+            # YouTube auto-subs repeat the previous cue's line above the new one
+            fresh = [l for l in lines if l not in previous]
+            if fresh:
+                cues.append((timing[0], timing[1], " ".join(fresh)))
+            previous = set(lines)
+
+    for raw in content.splitlines():
+        line = raw.strip()
+        match = _TIMING_RE.search(line)
+        if match:
+            flush()
+            timing, lines = (_seconds(match.group(1)), _seconds(match.group(2))), []
+        elif not line:
+            flush()
+            timing, lines = None, []
+        elif timing:
+            cleaned = _TAG_RE.sub('', line).strip()
+            if cleaned:
+                lines.append(html.unescape(cleaned))
+    flush()
+    return cues
+
+def replace_cues(db: Session, video_id: int, cues: List[Cue]):
+    """Swap a video's cues inside the caller's transaction (triggers update the FTS index)"""
+    db.query(SubtitleCue).filter(SubtitleCue.video_id == video_id).delete(synchronize_session=False)
+    if cues:
+        db.execute(SubtitleCue.__table__.insert(),
+                   [{"video_id": video_id, "start": s, "end": e, "text": t} for s, e, t in cues])
+
+def fts_query(query: str) -> str:
+    """User input -> safe FTS5 query: every word must match, the last one as a prefix"""
+    tokens = _TOKEN_RE.findall(query or "")
+    if not tokens:
+        return ""
+    quoted = [f'"{t}"' for t in tokens]
+    # One- and two-letter prefixes expand to thousands of terms; match those exactly
+    if len(tokens[-1]) >= MIN_PREFIX:
+        quoted[-1] += '*'
+    return " ".join(quoted)
+
+def _render_snippet(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+def search_cues(db: Session, query: str, limit: int = 30) -> List[Dict]:
+    """
+    Best matching cues, ranked by bm25 (newest first above RANK_CAP matches),
+    at most MAX_HITS_PER_VIDEO per video. Each hit: {video_id, start, end, snippet, score, title, thumbnail_path}.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    matches = db.execute(text(
+        "SELECT count(*) FROM (SELECT rowid FROM subtitle_cues_fts WHERE subtitle_cues_fts MATCH :match LIMIT :cap)"
+    ), {"match": match, "cap": RANK_CAP}).scalar()
+    ranked = matches < RANK_CAP
+
+    # 1. Candidate cues from the index alone, then at most MAX_HITS_PER_VIDEO per video
+    if ranked:
+        inner = "SELECT rowid AS cue_id, bm25(subtitle_cues_fts) AS score FROM subtitle_cues_fts " \
+                "WHERE subtitle_cues_fts MATCH :match ORDER BY rank LIMIT :window"
+        window, outer = limit * MAX_HITS_PER_VIDEO * 4, "hit.score"
+    else:
+        # Newest cues come from the end of the doclist without scoring anything
+        inner = "SELECT rowid AS cue_id FROM subtitle_cues_fts WHERE subtitle_cues_fts MATCH :match " \
+                "ORDER BY rowid DESC LIMIT :window"
+        window, outer = RANK_CAP, "hit.cue_id DESC"
+    score = "hit.score" if ranked else "NULL"
+    candidates = db.execute(text(
+        f"SELECT hit.cue_id, c.video_id, {score} FROM ({inner}) AS hit JOIN subtitle_cues c ON c.id = hit.cue_id ORDER BY {outer}"
+    ), {"match": match, "window": window}).all()
+
+    chosen, per_video = [], {}
+    for cue_id, video_id, score in candidates:
+        if per_video.get(video_id, 0) >= MAX_HITS_PER_VIDEO:
+            continue
+        per_video[video_id] = per_video.get(video_id, 0) + 1
+        chosen.append((cue_id, score))
+        if len(chosen) >= limit:
+            break
+    if not chosen:
+        return []
+
+    # 2. Snippets and video info only for the returned cues (rowid = ? is a direct seek in FTS5;
+    #    bm25 is not repeated here - it would re-read the whole doclist for its statistics)
+    snippet_sql = text(f"""
+        SELECT snippet(subtitle_cues_fts, 0, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 12),
+               c.video_id, c.start, c."end", v.title, v.thumbnail_path
+        FROM subtitle_cues_fts
+        JOIN subtitle_cues c ON c.id = subtitle_cues_fts.rowid
+        JOIN videos v ON v.id = c.video_id
+        WHERE subtitle_cues_fts MATCH :match AND subtitle_cues_fts.rowid = :cue_id
+    """)
+    hits = []
+    for cue_id, score in chosen:
+        row = db.execute(snippet_sql, {"match": match, "cue_id": cue_id}).first()
+        if row is None:
+            continue
+        snip, video_id, start, end, title, thumb = row
+        hits.append({"video_id": video_id, "start": start, "end": end, "snippet": _render_snippet(snip),
+                     "score": round(-score, 3) if score is not None else None, "title": title, "thumbnail_path": thumb})
+    return hits
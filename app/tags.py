@@ -0,0 +1,100 @@
+"""
+Normalized tags.
+`videos.tags` / `videos.ai_tags` stay the comma-separated source of truth for
+editing; every flush that changes them rewrites the video's rows in
+`video_tags`, and `tags.video_count` is kept by triggers. Tag lists, counts and
+tag filters are then index lookups instead of splitting strings for the whole
+library.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection
+
+from .database import SessionLocal, Tag, Video, VideoTag, engine
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK = 1000
+
+def normalize_tag(tag: str) -> str:
+    return (tag or "").strip().lower()
+
+def split_tags(*values: Optional[str]) -> List[str]:
+    """Distinct normalized tags of one or more comma-separated strings, in first-seen order"""
+    seen = {}
+    for value in values:
+        for tag in (value or "").split(","):
+            tag = normalize_tag(tag)
+            if tag:
+                seen.setdefault(tag, None)
+    return list(seen)
+
+def sync_video_tags(connection: Connection, videos: Dict[int, List[str]]):
+    """Replace the video_tags rows of {video_id: [tag, ...]} on `connection`"""
+    if not videos:
+        return
+    names = {t for tags in videos.values() for t in tags}
+    tag_ids = {}
+    if names:
+        connection.execute(text("INSERT OR IGNORE INTO tags (name, video_count) VALUES (:name, 0)"),
+                           [{"name": n} for n in names])
+        names = list(names)
+        for i in range(0, len(names), 500):
+            rows = connection.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names[i:i + 500])))
+            tag_ids.update({name: tag_id for tag_id, name in rows})
+    ids = list(videos)
+    for i in range(0, len(ids), 500):
+        connection.execute(VideoTag.__table__.delete().where(VideoTag.video_id.in_(ids[i:i + 500])))
+    rows = [{"tag_id": tag_ids[t], "video_id": vid} for vid, tags in videos.items() for t in tags]
+    if rows:
+        connection.execute(VideoTag.__table__.insert(), rows)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _sync_flushed_tags(session, flush_context):
+    changed = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Video) or obj.id is None:
+            continue
+        state = inspect(obj)
+        if obj in session.new or state.attrs.tags.history.has_changes() or state.attrs.ai_tags.history.has_changes():
+            changed[obj.id] = split_tags(obj.tags, obj.ai_tags)
+    if changed:
+        sync_video_tags(session.connection(), changed)
+
+def backfill_tags():
+    """One-off migration: index the tags of videos stored before the tag tables existed"""
+    total = 0
+    with engine.begin() as connection:
+        last_id = 0
+        while True:
+            rows = connection.execute(text(
+                "SELECT id, tags, ai_tags FROM videos WHERE id > :last AND (tags != '' OR ai_tags != '') "
+                "ORDER BY id LIMIT :n"
+            ), {"last": last_id, "n": BACKFILL_CHUNK}).all()
+            if not rows:
+                break
+            sync_video_tags(connection, {r.id: split_tags(r.tags, r.ai_tags) for r in rows})
+            last_id = rows[-1].id
+            total += len(rows)
+    if total:
+        logger.info(f"Tag index built for {total} videos")
+
+def tag_filter(names: Iterable[str]):
+    """Exact-match condition on Video: the video has at least one of `names`"""
+    # IN drives the lookup from video_tags' (tag_id, video_id) key - cost follows the tag's videos
+    return Video.id.in_(select(VideoTag.video_id).join(Tag, Tag.id == VideoTag.tag_id)
+                        .where(Tag.name.in_([normalize_tag(n) for n in names])))
+
+def list_tags(db, prefix: str = "", limit: Optional[int] = None, by_count: bool = False) -> List[Dict]:
+    """[{"name", "count"}] of tags used by at least one video"""
+    query = db.query(Tag.name, Tag.video_count).filter(Tag.video_count > 0)
+    if prefix:
+        # Range on the unique name index instead of LIKE
+        prefix = normalize_tag(prefix)
+        query = query.filter(Tag.name >= prefix, Tag.name < prefix + "\uffff")
+    query = query.order_by(Tag.video_count.desc(), Tag.name) if by_count else query.order_by(Tag.name)
+    if limit:
+        query = query.limit(limit)
+    return [{"name": name, "count": count} for name, count in query]
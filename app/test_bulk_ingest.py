@@ -0,0 +1,50 @@
+"""
+URL normalization (the dedupe key of imports) and bulk_ingest on a temporary database.
+"""
+import pytest
+
+from app.bulk_ingest import bulk_ingest, normalize_url
+from app.database import Video
+
+@pytest.mark.parametrize("raw,expected", [
+    ("https://Example.COM/watch?v=abc", "https://example.com/watch?v=abc"),
+    ("  https://example.com/watch?v=abc&utm_source=x&fbclid=1  ", "https://example.com/watch?v=abc"),
+    ("https://youtu.be/abc?si=track&t=30", "https://youtu.be/abc?t=30"),
+    ("https://example.com/v#comments", "https://example.com/v"),
+    ("https://example.com:443/v", "https://example.com/v"),
+    ("http://example.com:8080/v", "http://example.com:8080/v"),
+    ("https://example.com", "https://example.com/"),
+    ("HTTPS://user:pw@Example.com/v", "https://user:pw@example.com/v"),
+    # Kept byte-for-byte: no re-encoding of signed parameters, repeated keys stay
+    ("https://cdn.example.com/v.mp4?sig=a%2Fb%3D&e=1&e=2", "https://cdn.example.com/v.mp4?sig=a%2Fb%3D&e=1&e=2"),
+    ("/static/local_videos/a.mp4 ", "/static/local_videos/a.mp4"),
+    ("not a url", "not a url"),
+    ("https://[bad/v", "https://[bad/v"),
+])
+def test_normalize_url(raw, expected):
+    assert normalize_url(raw) == expected
+
+def test_fetch_url_is_stored_as_given(db):
+    signed = "https://cdn.example.com/v.mp4?token=abc&utm_source=feed#t=5"
+    bulk_ingest(db, [{"url": signed}, {"url": "https://site.example/watch?v=1&feature=share"}], "B")
+    db.commit()
+    rows = {v.url: v.source_url for v in db.query(Video)}
+    assert rows == {
+        signed: "https://cdn.example.com/v.mp4?token=abc",
+        "https://site.example/watch?v=1&feature=share": "https://site.example/watch?v=1",
+    }
+
+def test_duplicates_are_skipped_by_normalized_source(db):
+    first = bulk_ingest(db, [{"url": "https://a.example/v?id=1"}], "B")
+    db.commit()
+    again = bulk_ingest(db, [{"url": "https://A.example/v?id=1&utm_medium=x"},
+                             {"url": "https://a.example/v?id=1#top"},
+                             {"url": "https://a.example/v?id=2"}, {"url": " "}], "B")
+    assert first["inserted"] == 1
+    assert (again["inserted"], again["skipped"], again["invalid"]) == (1, 2, 1)
+
+def test_rows_stored_before_normalization_are_found(db):
+    db.add(Video(url="x", source_url="https://a.example/v?id=1&utm_source=old"))
+    db.commit()
+    result = bulk_ingest(db, [{"url": "https://a.example/v?id=1&utm_source=old"}], "B")
+    assert result["skipped"] == 1 and not result["ids"]
@@ -0,0 +1,53 @@
+"""
+Delta exports: videos deleted since the last export come out as tombstone rows
+recorded by the deleted_videos triggers.
+"""
+import csv
+import datetime
+import io
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app.database import DELETED_DDL, Video
+from app.export import DELTA_FIELDS, deleted_since, export_columns, stream_export
+
+@pytest.fixture
+def library(engine, db):
+    with engine.begin() as connection:
+        for ddl in DELETED_DDL:
+            connection.execute(text(ddl))
+    db.add_all([Video(url=f"u{i}", title=f"V{i}") for i in range(3)])
+    db.commit()
+    return db
+
+def _export(db, fmt, since):
+    query = db.query(*export_columns()).filter(Video.updated_at >= since).order_by(Video.id)
+    return b"".join(stream_export(query, fmt, deleted=deleted_since(db, since))).decode("utf-8")
+
+def test_delta_export_ends_with_tombstones(library):
+    since = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    library.query(Video).filter(Video.id == 2).delete()
+    library.commit()
+    rows = [json.loads(line) for line in _export(library, "ndjson", since).splitlines()]
+    assert [(r["id"], r["deleted"]) for r in rows] == [(1, False), (3, False), (2, True)]
+    assert rows[-1]["title"] is None and rows[-1]["updated_at"]
+    # A later delta no longer carries the tombstone
+    assert _export(library, "json", datetime.datetime.utcnow() + datetime.timedelta(minutes=1)) == "[]"
+
+def test_csv_delta_has_the_deleted_column(library):
+    since = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    library.query(Video).filter(Video.id == 1).delete()
+    library.commit()
+    reader = csv.DictReader(io.StringIO(_export(library, "csv", since)))
+    assert tuple(reader.fieldnames) == DELTA_FIELDS
+    assert [(r["id"], r["deleted"]) for r in reader][-1] == ("1", "True")
+
+def test_reused_id_drops_the_tombstone(library):
+    since = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+    library.query(Video).filter(Video.id == 3).delete()
+    library.commit()
+    library.add(Video(id=3, url="again"))
+    library.commit()
+    assert deleted_since(library, since).all() == []
@@ -0,0 +1,71 @@
+"""
+Incremental playlist walk (list_entries) against a fake yt-dlp listing:
+newest-first playlists stop early, oldest-first ones are walked to their new tail.
+"""
+import pytest
+
+from app import playlist_sync
+
+def _listing(urls, count=None):
+    info = {"_type": "playlist", "title": "P", "entries": iter([{"_type": "url", "url": u} for u in urls])}
+    if count is not None:
+        info["playlist_count"] = count
+    return info
+
+@pytest.fixture
+def fake_ydl(monkeypatch):
+    listing = {}
+
+    class FakeYDL:
+        def __init__(self, opts): pass
+        def __enter__(self): return self
+        def __exit__(self, *exc): return False
+        def extract_info(self, url, download=False, process=True, ie_key=None): return listing["info"]
+
+    monkeypatch.setattr(playlist_sync.yt_dlp, "YoutubeDL", FakeYDL)
+    monkeypatch.setattr(playlist_sync.rate_limiter, "acquire", lambda url: None)
+    monkeypatch.setattr(playlist_sync.rate_limiter, "report", lambda url, status: None)
+    monkeypatch.setattr(playlist_sync, "KNOWN_STOP", 3)
+    return listing
+
+OLD = [f"v{i}" for i in range(20)]
+
+def test_newest_first_stops_after_known_run(fake_ydl):
+    fake_ydl["info"] = _listing(["n1", "n2"] + OLD)
+    result = playlist_sync.list_entries("p", set(OLD))
+    assert result["entries"] == ["n1", "n2", "v0", "v1", "v2"]
+    assert not result["complete"]
+
+def test_oldest_first_walks_to_the_appended_tail(fake_ydl):
+    fake_ydl["info"] = _listing(OLD + ["n1", "n2"])
+    result = playlist_sync.list_entries("p", set(OLD))
+    assert result["entries"][-2:] == ["n1", "n2"]
+    assert result["complete"]
+
+def test_unchanged_length_stops_at_known_head(fake_ydl):
+    fake_ydl["info"] = _listing(OLD, count=len(OLD))
+    result = playlist_sync.list_entries("p", set(OLD))
+    assert result["entries"] == ["v0", "v1", "v2"]
+    assert not result["complete"]
+
+def test_grown_length_walks_known_head(fake_ydl):
+    fake_ydl["info"] = _listing(OLD + ["n1"], count=len(OLD) + 1)
+    assert playlist_sync.list_entries("p", set(OLD))["entries"][-1] == "n1"
+
+def test_sync_returns_only_appended_entries(fake_ydl, monkeypatch):
+    class Record:
+        entries, parser, batch_name = OLD, "yt-dlp", "B"
+
+    class Query:
+        def filter(self, *a): return self
+        def first(self): return Record
+
+    class Session:
+        def query(self, *a): return Query()
+        def close(self): pass
+
+    monkeypatch.setattr(playlist_sync, "SessionLocal", Session)
+    fake_ydl["info"] = _listing(OLD + ["n1", "n2"])
+    result = playlist_sync.sync_playlist("p")
+    assert result["new"] == ["n1", "n2"]
+    assert result["total"] == len(OLD) + 2
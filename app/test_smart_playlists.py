@@ -0,0 +1,32 @@
+"""
+Smart playlist rules: saving is strict, reading a playlist stored before rules were
+validated skips its invalid rules instead of failing the whole playlist.
+"""
+import pytest
+
+from app.database import SmartPlaylist, Video
+from app.queries import validate_rules
+from app.smart_playlists import SmartPlaylistCache
+
+LEGACY = [
+    {"field": "duration", "operator": "contains", "value": "1"},
+    {"field": "title", "operator": "greater_than", "value": "a"},
+    {"field": "height", "operator": "greater_than", "value": "700"},
+]
+
+def test_saving_rejects_operator_of_another_field_kind():
+    with pytest.raises(ValueError, match="Rule 1: duration does not support 'contains'"):
+        validate_rules(LEGACY)
+
+def test_stored_invalid_rules_are_skipped_on_read(db):
+    db.add_all([Video(url="a", height=1080), Video(url="b", height=480)])
+    playlist = SmartPlaylist(name="legacy", rules=LEGACY)
+    db.add(playlist)
+    db.commit()
+    cache = SmartPlaylistCache(size=4)
+    assert cache.ids(db, playlist).tolist() == [1]
+    assert [s.split(":")[0] for s in cache.skipped(playlist.id)] == ["Rule 1", "Rule 2"]
+    # Cached entries keep the skipped rules, a fixed playlist has none
+    assert len(cache.ids(db, playlist)) == 1 and len(cache.skipped(playlist.id)) == 2
+    playlist.rules = LEGACY[2:]
+    assert cache.ids(db, playlist).tolist() == [1] and cache.skipped(playlist.id) == []
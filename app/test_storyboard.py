@@ -0,0 +1,99 @@
+"""
+Storyboard tests: WebVTT cue layout, sheet generation with a stubbed ffmpeg run,
+the stream URL a backfill feeds to ffmpeg, and the /api/storyboards/backfill endpoint.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app import database, storyboard
+from app.database import Job, Video, get_db
+
+def test_interval_grows_for_long_videos():
+    assert storyboard.storyboard_interval(600) == storyboard.STORYBOARD_INTERVAL
+    assert storyboard.storyboard_interval(10 * 3600) == 90  # 36000 s / MAX_FRAMES
+
+def test_vtt_cues_walk_the_tile_grid():
+    vtt = storyboard.build_vtt(7, duration=1005, interval=10, sheets=2, ext="jpg").split("\n")
+    assert vtt[0] == "WEBVTT"
+    cues = [(vtt[i], vtt[i + 1]) for i in range(2, len(vtt) - 1, 3)]
+    assert len(cues) == 101
+    assert cues[0] == ("00:00:00.000 --> 00:00:10.000", "/static/storyboards/7/sheet_001.jpg#xywh=0,0,160,90")
+    assert cues[11][1] == "/static/storyboards/7/sheet_001.jpg#xywh=160,90,160,90"
+    # Cue 101 starts the second sheet, the last cue ends at the video's end
+    assert cues[100] == ("00:16:40.000 --> 00:16:45.000", "/static/storyboards/7/sheet_002.jpg#xywh=0,0,160,90")
+
+def test_vtt_stops_at_the_generated_sheets():
+    vtt = storyboard.build_vtt(1, duration=5000, interval=10, sheets=1, ext="webp")
+    assert vtt.count("#xywh=") == storyboard.COLS * storyboard.ROWS
+
+def test_generate_storyboard_writes_sheets_and_vtt(tmp_path, monkeypatch):
+    monkeypatch.setattr(storyboard, "STORYBOARD_DIR", str(tmp_path))
+    monkeypatch.setattr(storyboard, "PREVIEW_DIR", str(tmp_path))
+    monkeypatch.setattr(storyboard.os.path, "exists", lambda p: True)
+    commands = []
+
+    def fake_ffmpeg(cmd, **kwargs):
+        commands.append(cmd)
+        pattern = next(a for a in cmd if "sheet_%03d" in a)
+        for n in (1, 2):
+            open(pattern.replace("%03d", f"{n:03d}"), "wb").close()
+
+    monkeypatch.setattr(storyboard.subprocess, "run", fake_ffmpeg)
+    assert storyboard.generate_storyboard(3, "https://cdn/v.mp4", 1500) == "/static/storyboards/3/sheet_001.jpg"
+    # One keyframe read of the input writes the sheets and the spread preview frames
+    assert commands[0].count("-i") == 1 and "https://cdn/v.mp4" in commands[0] and "-skip_frame" in commands[0]
+    assert commands[0][-1] == str(tmp_path / "3_%d.jpg")
+    with open(tmp_path / "3" / "storyboard.vtt", encoding="utf-8") as f:
+        assert f.read().count("sheet_002.jpg") == 50
+
+def test_generate_storyboard_skips_unknown_length():
+    assert storyboard.generate_storyboard(3, "https://cdn/v.mp4", 0) is None
+
+def _video(**kw):
+    return Video(id=1, url="https://cdn/expired.mp4?sig=old", source_url="https://site/watch/1", **kw)
+
+def test_backfill_input_is_a_fresh_stream_url(monkeypatch):
+    calls = []
+    monkeypatch.setattr(storyboard.info_cache, "extract", lambda url: calls.append(url) or {"url": "https://cdn/fresh.mp4"})
+    assert storyboard.storyboard_input(_video()) == "https://cdn/fresh.mp4"
+    assert calls == ["https://site/watch/1"]
+
+def test_backfill_input_falls_back_to_the_stored_url(monkeypatch):
+    monkeypatch.setattr(storyboard.info_cache, "extract", lambda url: None)
+    assert storyboard.storyboard_input(_video()) == "https://cdn/expired.mp4?sig=old"
+    # Local files and direct links are not extracted at all
+    monkeypatch.setattr(storyboard.info_cache, "extract", lambda url: pytest.fail("extracted"))
+    local = Video(id=2, url="/static/local_videos/a.mp4", source_url=None)
+    assert storyboard.storyboard_input(local) == "/static/local_videos/a.mp4"
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    # app.main runs init_db() on import - keep it away from ./videos.db
+    monkeypatch.setattr(database, "init_db", lambda: None)
+    from app.main import app
+    Session = sessionmaker(bind=engine)
+
+    def override():
+        db = Session()
+        try: yield db
+        finally: db.close()
+
+    app.dependency_overrides[get_db] = override
+    yield TestClient(app), Session
+    app.dependency_overrides.pop(get_db, None)
+
+def test_backfill_endpoint_queues_chunks(client):
+    http, Session = client
+    db = Session()
+    db.add_all([Video(url=f"u{i}", status="ready", duration=60) for i in range(30)]
+               + [Video(url="pending", status="pending", duration=60), Video(url="no-length", status="ready", duration=0),
+                  Video(url="done", status="ready", duration=60, sprite_path="/static/storyboards/x/sheet_001.jpg")])
+    db.commit()
+
+    assert http.post("/api/storyboards/backfill").json() == {"queued": 30}
+    jobs = db.query(Job).filter(Job.kind == "storyboard").order_by(Job.id).all()
+    assert [len(j.payload["video_ids"]) for j in jobs] == [25, 5]
+    assert all(j.priority == -10 for j in jobs)
+    assert http.post("/api/storyboards/backfill", params={"force": True}).json() == {"queued": 31}
+    db.close()
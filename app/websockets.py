@@ -1,21 +1,286 @@
-
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set
+import asyncio
 import json
+import logging
+import os
+import queue
+import threading
+import time
 from fastapi import WebSocket
 
+logger = logging.getLogger(__name__)
+
+MAX_VIDEO_TOPICS = 5000
+
+def subscription_topics(data: dict) -> Set[str]:
+    """
+    Client message {"action": "subscribe", "batches": [...], "video_ids": [...], "aria2": bool, "imports": bool, "all": bool}
+    -> topic set. A subscribe message replaces the client's previous interest.
+    """
+    topics = {f"batch:{b}" for b in (data.get("batches") or []) if b}
+    topics.update(f"video:{int(v)}" for v in (data.get("video_ids") or [])[:MAX_VIDEO_TOPICS])
+    if data.get("aria2"): topics.add("aria2")
+    if data.get("imports"): topics.add("imports")
+    if data.get("all"): topics.add("all")
+    return topics
+
+def message_topics(message: dict) -> List[str]:
+    topics = ["all"]
+    if message.get("video_id") is not None: topics.append(f"video:{message['video_id']}")
+    if message.get("batch_name"): topics.append(f"batch:{message['batch_name']}")
+    if str(message.get("type", "")).startswith("aria2"): topics.append("aria2")
+    if message.get("type") == "import_progress": topics.append("imports")
+    return topics
+
+class ClientConnection:
+    """One WebSocket with its own bounded outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        # Until the client subscribes it gets everything (old clients never subscribe)
+        self.topics: Set[str] = {"all"}
+
+    def stats(self) -> Dict:
+        return {
+            "topics": len(self.topics),
+            "queue_depth": self.queue.qsize(), "sent": self.sent, "dropped": self.dropped,
+            "avg_send_ms": round(self.send_seconds / self.sent * 1000, 2) if self.sent else None,
+            "max_send_ms": round(self.max_send_seconds * 1000, 2),
+        }
+
 class ConnectionManager:
+    """
+    Fan-out never awaits a client: broadcast() only enqueues, and every connection
+    drains its own queue. A client whose queue is full either loses its oldest
+    messages (drop_oldest) or is disconnected (disconnect).
+    """
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # topic -> interested sockets; routing cost follows interest, not clients x events
+        self.topic_index: Dict[str, Set[WebSocket]] = {}
+        self.routed = {"events": 0, "deliveries": 0}
+        self.max_queue = int(os.environ.get("VIP_WS_QUEUE_SIZE", 100))
+        self.slow_policy = os.environ.get("VIP_WS_SLOW_POLICY", "drop_oldest")  # drop_oldest | disconnect
+        self.send_timeout = float(os.environ.get("VIP_WS_SEND_TIMEOUT", 10))
+        self.laggards_disconnected = 0
+        self._closing = set()
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, self.max_queue)
+        client.task = asyncio.get_running_loop().create_task(self._sender(client))
+        self.clients[websocket] = client
+        self._index(websocket, client.topics)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._unindex(websocket, client.topics)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def _index(self, websocket: WebSocket, topics: Iterable[str]):
+        for topic in topics:
+            self.topic_index.setdefault(topic, set()).add(websocket)
+
+    def _unindex(self, websocket: WebSocket, topics: Iterable[str]):
+        for topic in topics:
+            sockets = self.topic_index.get(topic)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets: del self.topic_index[topic]
+
+    def subscribe(self, websocket: WebSocket, topics: Set[str]):
+        client = self.clients.get(websocket)
+        if not client:
+            return
+        self._unindex(websocket, client.topics)
+        client.topics = set(topics)
+        self._index(websocket, client.topics)
+
+    async def _sender(self, client: ClientConnection):
+        while True:
+            message = await client.queue.get()
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(client.websocket.send_text(message), self.send_timeout)
+            except Exception as e:
+                logger.info(f"Dropping WebSocket client after failed send: {e!r}")
+                self.disconnect(client.websocket)
+                return
+            elapsed = time.monotonic() - started
+            client.sent += 1
+            client.send_seconds += elapsed
+            client.max_send_seconds = max(client.max_send_seconds, elapsed)
+
+    async def _close_laggard(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)  # try again later
+        except Exception:
+            pass
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        for websocket, client in list(self.clients.items()):
+            self._enqueue(websocket, client, message)
+
+    async def send_to(self, websocket: WebSocket, message: str):
+        client = self.clients.get(websocket)
+        if client:
+            self._enqueue(websocket, client, message)
+
+    async def route(self, updates: List[dict]):
+        """Deliver each update only to clients subscribed to one of its topics"""
+        per_client: Dict[WebSocket, List[dict]] = {}
+        for update in updates:
+            targets = set()
+            for topic in message_topics(update):
+                targets.update(self.topic_index.get(topic, ()))
+            for websocket in targets:
+                per_client.setdefault(websocket, []).append(update)
+        self.routed["events"] += len(updates)
+        for websocket, items in per_client.items():
+            client = self.clients.get(websocket)
+            if not client:
+                continue
+            frame = items[0] if len(items) == 1 else {"type": "status_batch", "updates": items}
+            self.routed["deliveries"] += len(items)
+            self._enqueue(websocket, client, json.dumps(frame))
+
+    def _enqueue(self, websocket: WebSocket, client: ClientConnection, message: str):
+        try:
+            client.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            if self.slow_policy == "disconnect":
+                self.disconnect(websocket)
+                self.laggards_disconnected += 1
+                task = asyncio.get_running_loop().create_task(self._close_laggard(websocket))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+            else:
+                client.queue.get_nowait()
+                client.queue.put_nowait(message)
+                client.dropped += 1
+
+    def get_stats(self) -> Dict:
+        clients = [c.stats() for c in self.clients.values()]
+        return {
+            "connections": len(clients),
+            "policy": self.slow_policy,
+            "max_queue": self.max_queue,
+            "queued": sum(c["queue_depth"] for c in clients),
+            "dropped": sum(c["dropped"] for c in clients),
+            "laggards_disconnected": self.laggards_disconnected,
+            **self.routed,
+            "topics": {t: len(s) for t, s in sorted(self.topic_index.items(), key=lambda i: -len(i[1]))[:20]},
+            "clients": clients,
+        }
 
 manager = ConnectionManager()
+
+# Fields describing a video's state; the latest status_update replaces them as a whole
+STATUS_FIELDS = ("status", "error", "error_msg")
+
+class StatusBus:
+    """
+    Status events from worker threads to WebSocket clients.
+    publish() is thread-safe and never touches the sockets; a task on the server
+    loop collects events for `window` seconds, keeps only the latest state per
+    video and the latest progress per file import, and routes them to subscribed
+    clients (one `status_batch` frame per client when it gets more than one update).
+    """
+
+    def __init__(self, manager: ConnectionManager, window: float = 0.1):
+        self.manager = manager
+        self.window = window
+        self._queue: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._scheduled = threading.Event()
+        self._stats = {"published": 0, "coalesced": 0, "frames": 0}
+
+    def publish(self, message: dict):
+        """Queue a status message from any thread (dropped while the bus is not running)"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        self._queue.put(message)
+        self._stats["published"] += 1
+        # One wake-up per window, not one cross-thread call per event
+        if not self._scheduled.is_set():
+            self._scheduled.set()
+            loop.call_soon_threadsafe(self._wake.set)
+
+    def _drain(self) -> List[dict]:
+        merged: Dict[int, dict] = {}
+        imports: Dict[str, dict] = {}
+        others: List[dict] = []
+        while True:
+            try:
+                message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            video_id = message.get("video_id")
+            if message.get("type") == "status_update" and video_id is not None:
+                if video_id in merged:
+                    self._stats["coalesced"] += 1
+                # Later state wins; display fields (title, thumbnail) of earlier events are kept,
+                # their status fields are not (a stale "error" must not ride along with "ready")
+                kept = {k: v for k, v in merged.get(video_id, {}).items() if k not in STATUS_FIELDS}
+                merged[video_id] = {**kept, **message}
+            elif message.get("type") == "import_progress" and message.get("batch_name"):
+                # Totals are cumulative: the latest report of an import (the final done=True one
+                # included) replaces the chunks before it
+                if message["batch_name"] in imports:
+                    self._stats["coalesced"] += 1
+                imports[message["batch_name"]] = message
+            else:
+                others.append(message)
+        return others + list(imports.values()) + list(merged.values())
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.window)
+            self._wake.clear()
+            self._scheduled.clear()
+            updates = self._drain()
+            if not updates:
+                continue
+            self._stats["frames"] += 1
+            try:
+                await self.manager.route(updates)
+            except Exception as e:
+                logger.error(f"Status broadcast failed: {e}")
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        self._loop = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, "pending": self._queue.qsize(), "window_ms": int(self.window * 1000)}
+
+status_bus = StatusBus(manager)